@@ -0,0 +1,179 @@
+"""Local stand-ins for the external services the backend talks to.
+
+FakeBackends replaces Google speech recognition, the translate package's
+provider and ElevenLabs with in-process fakes whose latency is
+configurable, so load tests measure our own overhead and not the
+internet's. Run this module directly to serve the real app with fakes:
+
+    python -m benchmarks.fakes --port 8000 --asr-latency 0.3
+"""
+import argparse
+import asyncio
+import os
+import random
+import socket
+import tempfile
+import time
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def isolated_environment(workdir=None):
+    """Point every on-disk store at a scratch directory before main is imported."""
+    workdir = workdir or tempfile.mkdtemp(prefix="chat-bench-")
+    os.environ.setdefault("ELEVEN_LABS_API_KEY", "benchmark")
+    os.environ["TRANSLATION_CACHE_DB"] = os.path.join(workdir, "translation_cache.db")
+    os.environ["MESSAGE_DB"] = os.path.join(workdir, "messages.db")
+    os.environ["DATABASE_URL"] = "sqlite+aiosqlite:///" + os.path.join(workdir, "main.db")
+    os.environ["TTS_CACHE_DIR"] = os.path.join(workdir, "tts_cache")
+    return workdir
+
+
+def _jittered(latency, jitter):
+    return max(0.0, random.uniform(latency - jitter, latency + jitter))
+
+
+class FakeTranslator:
+    """Drop-in for translate.Translator with a fixed upstream latency."""
+
+    latency = 0.1
+    jitter = 0.0
+    calls = 0
+
+    def __init__(self, from_lang="autodetect", to_lang="en", **kwargs):
+        self.from_lang = from_lang
+        self.to_lang = to_lang
+
+    def translate(self, text):
+        FakeTranslator.calls += 1
+        time.sleep(_jittered(self.latency, self.jitter))
+        return f"[{self.to_lang}] {text}"
+
+
+def make_fake_tts_app(first_byte_latency, chunk_count=8, chunk_size=4096, chunk_interval=0.01):
+    """ASGI app answering /v1/text-to-speech/{voice} like ElevenLabs, streaming dummy MP3 bytes."""
+
+    async def app(scope, receive, send):
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    await send({"type": "lifespan.startup.complete"})
+                elif message["type"] == "lifespan.shutdown":
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+        if scope["type"] != "http":
+            return
+
+        more_body = True
+        while more_body:
+            message = await receive()
+            more_body = message.get("more_body", False)
+
+        if not scope["path"].startswith("/v1/text-to-speech/"):
+            await send({"type": "http.response.start", "status": 404, "headers": []})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        await asyncio.sleep(first_byte_latency)
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"audio/mpeg")]})
+        for i in range(chunk_count):
+            await send({"type": "http.response.body", "body": bytes([i % 256]) * chunk_size, "more_body": True})
+            await asyncio.sleep(chunk_interval)
+        await send({"type": "http.response.body", "body": b""})
+
+    return app
+
+
+class FakeBackends:
+
+    def __init__(self, asr_latency=0.3, translation_latency=0.1, tts_latency=0.2, jitter=0.0, tts_port=None):
+        self.asr_latency = asr_latency
+        self.translation_latency = translation_latency
+        self.tts_latency = tts_latency
+        self.jitter = jitter
+        self.tts_port = tts_port or free_port()
+        self.asr_calls = 0
+        self._tts_server = None
+        self._tts_task = None
+
+    @property
+    def tts_url(self):
+        return f"http://127.0.0.1:{self.tts_port}"
+
+    def install(self):
+        """Patch the backend modules. Call after main has been imported."""
+        from functions import speech_engines, text_to_speech, translator
+
+        backends = self
+
+        class FakeSpeechEngine(speech_engines.SpeechEngine):
+            name = "fake"
+
+            def recognize(self, pcm, sample_rate, sample_width, language):
+                backends.asr_calls += 1
+                time.sleep(_jittered(backends.asr_latency, backends.jitter))
+                return "hello how are you"
+
+        speech_engines.use_engine(FakeSpeechEngine())
+
+        FakeTranslator.latency = self.translation_latency
+        FakeTranslator.jitter = self.jitter
+        translator.Translator = FakeTranslator
+
+        text_to_speech.ELEVEN_LABS_BASE_URL = self.tts_url
+
+    async def start(self):
+        import uvicorn
+
+        config = uvicorn.Config(make_fake_tts_app(self.tts_latency), host="127.0.0.1", port=self.tts_port,
+                                log_level="warning", lifespan="off")
+        self._tts_server = uvicorn.Server(config)
+        self._tts_task = asyncio.create_task(self._tts_server.serve())
+        while not self._tts_server.started:
+            await asyncio.sleep(0.01)
+
+    async def stop(self):
+        if self._tts_server is not None:
+            self._tts_server.should_exit = True
+            await self._tts_task
+
+    def stats(self):
+        return {"asr_calls": self.asr_calls, "translation_calls": FakeTranslator.calls}
+
+
+async def serve(args):
+    import uvicorn
+
+    isolated_environment(args.workdir)
+    fakes = FakeBackends(args.asr_latency, args.translation_latency, args.tts_latency, args.jitter)
+    os.environ["ELEVEN_LABS_BASE_URL"] = fakes.tts_url
+    import main
+
+    fakes.install()
+    await fakes.start()
+    server = uvicorn.Server(uvicorn.Config(main.app, host=args.host, port=args.port, log_level="warning"))
+    try:
+        await server.serve()
+    finally:
+        await fakes.stop()
+
+
+def add_latency_arguments(parser):
+    parser.add_argument("--asr-latency", type=float, default=0.3, help="seconds per fake recognition")
+    parser.add_argument("--translation-latency", type=float, default=0.1, help="seconds per fake translation")
+    parser.add_argument("--tts-latency", type=float, default=0.2, help="seconds to first fake TTS byte")
+    parser.add_argument("--jitter", type=float, default=0.0, help="+/- seconds added to each fake latency")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the backend with fake upstream services")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workdir", default=None, help="directory for the scratch databases")
+    add_latency_arguments(parser)
+    asyncio.run(serve(parser.parse_args()))
@@ -0,0 +1,336 @@
+"""Load test for the backend.
+
+Starts the Socket.IO + FastAPI app in-process with fake upstream services
+(see benchmarks/fakes.py), drives Socket.IO rooms, /ws/audio streams and the
+HTTP endpoints concurrently, and reports throughput and p50/p95/p99 latency
+per endpoint. Run from the backend directory:
+
+    python -m benchmarks.run --rooms 10 --users-per-room 5 --output results.json
+    python -m benchmarks.run --output new.json --compare results.json
+
+Pass --url to drive a server that is already running (for example
+`python -m benchmarks.fakes` or a multi-worker deployment) instead.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import time
+import uuid
+from collections import defaultdict
+
+import httpx
+import numpy as np
+import socketio
+import websockets
+
+from benchmarks import fakes
+from functions import audio
+
+LANGUAGES = ["en", "es", "fr", "de"]
+# Errors printed per endpoint; the rest are only counted
+ERRORS_SHOWN = 3
+PHRASES = ["hello", "thanks", "ok", "how are you", "see you tomorrow", "good morning", "where are you", "yes", "no"]
+
+
+class Recorder:
+    """Collects latency samples and errors per endpoint."""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.started = defaultdict(lambda: math.inf)
+        self.finished = defaultdict(float)
+
+    def add(self, name, started, finished=None):
+        finished = finished or time.perf_counter()
+        self.samples[name].append(finished - started)
+        self.started[name] = min(self.started[name], started)
+        self.finished[name] = max(self.finished[name], finished)
+
+    def error(self, name, cause=None):
+        self.errors[name] += 1
+        # The first few causes per endpoint are enough to tell what went wrong
+        if cause is not None and self.errors[name] <= ERRORS_SHOWN:
+            print(f"{name} failed: {cause!r}", file=sys.stderr)
+
+    def report(self):
+        report = {}
+        for name in sorted(set(self.samples) | set(self.errors)):
+            samples = sorted(self.samples.get(name, []))
+            elapsed = self.finished[name] - self.started[name] if samples else 0.0
+            report[name] = {
+                "count": len(samples),
+                "errors": self.errors.get(name, 0),
+                "throughput_per_s": round(len(samples) / elapsed, 2) if elapsed > 0 else None,
+                "p50_ms": percentile(samples, 50),
+                "p95_ms": percentile(samples, 95),
+                "p99_ms": percentile(samples, 99),
+                "max_ms": round(samples[-1] * 1000, 2) if samples else None,
+            }
+        return report
+
+
+def percentile(sorted_samples, pct):
+    if not sorted_samples:
+        return None
+    rank = max(0, math.ceil(pct / 100 * len(sorted_samples)) - 1)
+    return round(sorted_samples[rank] * 1000, 2)
+
+
+async def gather_limited(limit, coroutines):
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(coroutine):
+        async with semaphore:
+            return await coroutine
+
+    return await asyncio.gather(*(run(c) for c in coroutines))
+
+
+# Socket.IO rooms: join, set_language, send_message, wait for our own message to come back
+async def socketio_user(url, room_id, language, messages, interval, recorder, ready):
+    client = socketio.AsyncClient(reconnection=False)
+    pending = {}
+
+    @client.on("message")
+    async def on_message(data):
+        started = pending.pop(data.get("text"), None)
+        if started is not None:
+            recorder.add("socketio.send_message", started)
+
+    try:
+        started = time.perf_counter()
+        await client.connect(url, transports=["websocket"])
+        recorder.add("socketio.connect", started)
+        await client.emit("set_language", language)
+        await client.emit("join_room", (room_id, f"user-{uuid.uuid4().hex[:6]}"))
+    except Exception as e:
+        recorder.error("socketio.connect", e)
+        return
+
+    await ready
+    for i in range(messages):
+        text = f"{PHRASES[i % len(PHRASES)]} #{uuid.uuid4().hex[:8]}"
+        pending[text] = time.perf_counter()
+        await client.emit("send_message", {"roomId": room_id, "username": "bench", "text": text})
+        await asyncio.sleep(interval)
+
+    deadline = time.perf_counter() + 30
+    while pending and time.perf_counter() < deadline:
+        await asyncio.sleep(0.05)
+    for text in pending:
+        recorder.error("socketio.send_message", f"no echo of {text!r} within 30 s")
+    await client.disconnect()
+
+
+async def run_socketio(args, url, recorder):
+    loop = asyncio.get_running_loop()
+    ready = loop.create_future()
+    users = []
+    for room in range(args.rooms):
+        room_id = f"bench-{room}"
+        for member in range(args.users_per_room):
+            language = LANGUAGES[member % len(LANGUAGES)]
+            users.append(socketio_user(url, room_id, language, args.messages, args.message_interval, recorder, ready))
+    tasks = [asyncio.create_task(user) for user in users]
+    # Let everyone join before the first message so fan-out sees full rooms
+    await asyncio.sleep(max(1.0, 0.01 * len(users)))
+    if not ready.done():
+        ready.set_result(True)
+    await asyncio.gather(*tasks)
+
+
+def utterance_frame(sample_rate=48000, speech_seconds=1.0, silence_seconds=0.8):
+    # A tone the VAD treats as speech followed by enough silence to close the segment
+    t = np.arange(int(sample_rate * speech_seconds)) / sample_rate
+    speech = 0.3 * np.sin(2 * np.pi * 220 * t)
+    silence = np.zeros(int(sample_rate * silence_seconds))
+    samples = np.concatenate([silence[: sample_rate // 4], speech, silence]).astype(np.float32)
+    return audio.encode_pcm_frame(samples, sample_rate, audio.FORMAT_FLOAT32)
+
+
+async def audio_stream(url, utterances, recorder):
+    frame = utterance_frame()
+    try:
+        started = time.perf_counter()
+        async with websockets.connect(url, max_size=None) as ws:
+            recorder.add("ws_audio.connect", started)
+            await ws.send(json.dumps({"selectedFrom": "en-US", "selectedTo": "es", "mode": "stream"}))
+            for _ in range(utterances):
+                started = time.perf_counter()
+                await ws.send(frame)
+                try:
+                    reply = json.loads(await asyncio.wait_for(ws.recv(), timeout=30))
+                except asyncio.TimeoutError as e:
+                    recorder.error("ws_audio.utterance", e)
+                    continue
+                if reply.get("type") == "final":
+                    recorder.add("ws_audio.utterance", started)
+                else:
+                    recorder.error("ws_audio.utterance", reply)
+    except Exception as e:
+        recorder.error("ws_audio.connect", e)
+
+
+async def run_ws_audio(args, url, recorder):
+    ws_url = url.replace("http://", "ws://").replace("https://", "wss://") + "/ws/audio"
+    await asyncio.gather(*(audio_stream(ws_url, args.utterances, recorder) for _ in range(args.ws_streams)))
+
+
+async def timed_request(client, recorder, name, method, path, **kwargs):
+    started = time.perf_counter()
+    try:
+        response = await client.request(method, path, **kwargs)
+        if name == "http.text_voice":
+            await response.aread()
+        if response.status_code >= 400:
+            recorder.error(name, f"HTTP {response.status_code}")
+            return
+        recorder.add(name, started)
+    except httpx.HTTPError as e:
+        recorder.error(name, e)
+
+
+async def run_http(args, url, recorder):
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+        phrases = itertools.cycle(PHRASES)
+        requests = []
+        for i in range(args.http_requests):
+            phrase = next(phrases)
+            language = LANGUAGES[1 + i % (len(LANGUAGES) - 1)]
+            requests.append(timed_request(client, recorder, "http.text_translate", "POST", "/text_translate/",
+                                          json={"text": phrase, "language": language}))
+            if i % 10 == 0:
+                items = [{"text": p, "language": language} for p in PHRASES]
+                requests.append(timed_request(client, recorder, "http.text_translate_batch", "POST",
+                                              "/text_translate/batch", json={"items": items}))
+            if i % 4 == 0:
+                requests.append(timed_request(client, recorder, "http.text_voice", "POST", "/text_voice/",
+                                              json={"text": phrase, "selectedGender": "F" if i % 8 else "M"}))
+            requests.append(timed_request(client, recorder, "http.check_anonym_code", "POST", "/check_anonym_code/",
+                                          json={"code": f"code-{i % 50}"}))
+        await gather_limited(args.concurrency, requests)
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
+
+
+def compare(current, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)["results"]
+    print(f"\nCompared with {baseline_path}:")
+    for name, result in current.items():
+        before = baseline.get(name)
+        if not before:
+            print(f"  {name:32} (new)")
+            continue
+        deltas = []
+        for key in ("throughput_per_s", "p50_ms", "p95_ms", "p99_ms"):
+            if result.get(key) is not None and before.get(key):
+                change = (result[key] - before[key]) / before[key] * 100
+                deltas.append(f"{key} {change:+.1f}%")
+        print(f"  {name:32} " + ", ".join(deltas))
+
+
+def print_report(report):
+    header = f"{'endpoint':32} {'count':>7} {'errors':>7} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+    print(header)
+    print("-" * len(header))
+    for name, r in report.items():
+        print(f"{name:32} {r['count']:>7} {r['errors']:>7} {str(r['throughput_per_s']):>9} "
+              f"{str(r['p50_ms']):>9} {str(r['p95_ms']):>9} {str(r['p99_ms']):>9}")
+
+
+async def run(args):
+    recorder = Recorder()
+    backends = None
+    server = server_task = None
+    url = args.url
+
+    if url is None:
+        import uvicorn
+
+        fakes.isolated_environment()
+        backends = fakes.FakeBackends(args.asr_latency, args.translation_latency, args.tts_latency, args.jitter)
+        os.environ["ELEVEN_LABS_BASE_URL"] = backends.tts_url
+        import main as backend
+
+        backends.install()
+        await backends.start()
+        port = fakes.free_port()
+        server = uvicorn.Server(uvicorn.Config(backend.app, host="127.0.0.1", port=port, log_level="warning"))
+        server_task = asyncio.create_task(server.serve())
+        while not server.started:
+            await asyncio.sleep(0.01)
+        url = f"http://127.0.0.1:{port}"
+
+    started = time.perf_counter()
+    try:
+        scenarios = []
+        if "socketio" in args.scenarios:
+            scenarios.append(run_socketio(args, url, recorder))
+        if "ws_audio" in args.scenarios:
+            scenarios.append(run_ws_audio(args, url, recorder))
+        if "http" in args.scenarios:
+            scenarios.append(run_http(args, url, recorder))
+        await asyncio.gather(*scenarios)
+    finally:
+        if server is not None:
+            server.should_exit = True
+            await server_task
+            await backends.stop()
+
+    report = recorder.report()
+    print_report(report)
+    result = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_revision": git_revision(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "duration_s": round(time.perf_counter() - started, 2),
+            "config": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+            "fakes": backends.stats() if backends else None,
+        },
+        "results": report,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"\nSaved results to {args.output}")
+    if args.compare:
+        compare(report, args.compare)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the chat backend")
+    parser.add_argument("--url", default=None, help="drive an already running server instead of starting one")
+    parser.add_argument("--scenarios", nargs="+", default=["socketio", "ws_audio", "http"],
+                        choices=["socketio", "ws_audio", "http"])
+    parser.add_argument("--rooms", type=int, default=5)
+    parser.add_argument("--users-per-room", type=int, default=8)
+    parser.add_argument("--messages", type=int, default=10, help="messages sent by each room member")
+    parser.add_argument("--message-interval", type=float, default=0.1)
+    parser.add_argument("--ws-streams", type=int, default=10)
+    parser.add_argument("--utterances", type=int, default=5, help="utterances sent on each audio stream")
+    parser.add_argument("--http-requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50, help="concurrent HTTP requests")
+    parser.add_argument("--output", default=None, help="write results as JSON to this file")
+    parser.add_argument("--compare", default=None, help="earlier JSON results to compare against")
+    fakes.add_latency_arguments(parser)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    asyncio.run(run(parse_args()))
@@ -0,0 +1,32 @@
+from decouple import config
+from sqlalchemy import Column, Integer, String
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+# SQLAlchemy side of functions/anonym_codes.py, kept in its own module so the
+# (large) SQLAlchemy import only happens once codes are actually used
+
+# Database setup
+DATABASE_URL = config("DATABASE_URL", default="sqlite+aiosqlite:///./main.db")
+DB_POOL_SIZE = config("DB_POOL_SIZE", default=5, cast=int)
+DB_MAX_OVERFLOW = config("DB_MAX_OVERFLOW", default=10, cast=int)
+
+# The pool class is explicit because older SQLAlchemy releases default to
+# NullPool for aiosqlite, which rejects pool_size and max_overflow
+engine = create_async_engine(
+    DATABASE_URL,
+    poolclass=AsyncAdaptedQueuePool,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_pre_ping=True,
+)
+SessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+Base = declarative_base()
+
+
+class AnonymCode(Base):
+    __tablename__ = "anonym_codes"
+    id = Column(Integer, primary_key=True, index=True)
+    code = Column(String, unique=True, index=True)
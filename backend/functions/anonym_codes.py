@@ -0,0 +1,115 @@
+import asyncio
+import time
+from decouple import config
+
+# How stale the in-memory index may get before a miss re-checks the table
+# for codes inserted by other workers
+CODE_SYNC_SECONDS = config("ANONYM_CODE_SYNC_SECONDS", default=5, cast=float)
+
+_db = None
+
+
+def _database():
+    # Imported on first use (normally the startup hook) rather than with main
+    global _db
+    if _db is None:
+        from functions import anonym_code_db
+        _db = anonym_code_db
+    return _db
+
+
+# In-memory set of every known code, warmed at startup and kept in sync on
+# insert, so existence checks (mostly negative ones) never touch the database
+class CodeIndex:
+
+    def __init__(self):
+        self.codes = set()
+        self.loaded = False
+        self._last_id = 0
+        self._synced_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def stale(self):
+        return not self.loaded or time.monotonic() - self._synced_at > CODE_SYNC_SECONDS
+
+    async def sync(self, if_stale=False):
+        # Incremental: only rows added since the last sync are read
+        from sqlalchemy import select
+        db = _database()
+        async with self._lock:
+            # A burst of misses queues up here; only the first one reads
+            if if_stale and not self.stale():
+                return
+            async with db.SessionLocal() as session:
+                rows = (await session.execute(
+                    select(db.AnonymCode.id, db.AnonymCode.code).where(db.AnonymCode.id > self._last_id)
+                )).all()
+            for row_id, code in rows:
+                self.codes.add(code)
+                self._last_id = max(self._last_id, row_id)
+            self.loaded = True
+            self._synced_at = time.monotonic()
+
+    async def contains(self, code):
+        if code in self.codes:
+            return True
+        if self.stale():
+            await self.sync(if_stale=True)
+            return code in self.codes
+        return False
+
+    def add(self, code):
+        self.codes.add(code)
+
+
+index = CodeIndex()
+
+
+async def init():
+    db = _database()
+    async with db.engine.begin() as conn:
+        await conn.run_sync(db.Base.metadata.create_all)
+    await index.sync()
+
+
+async def close():
+    if _db is not None:
+        await _db.engine.dispose()
+
+
+async def save_code(code):
+    db = _database()
+    async with db.SessionLocal() as session:
+        new_code = db.AnonymCode(code=code)
+        session.add(new_code)
+        await session.commit()
+    index.add(code)
+    return new_code
+
+
+async def code_exists(code):
+    return await index.contains(code)
+
+
+async def save_codes(codes):
+    """Insert many codes in one statement; returns (saved, already_existing)."""
+    unique = list(dict.fromkeys(codes))
+    existing = [code for code in unique if await index.contains(code)]
+    new_codes = [code for code in unique if code not in index.codes]
+    if new_codes:
+        from sqlalchemy import insert
+        db = _database()
+        async with db.SessionLocal() as session:
+            # OR IGNORE covers codes another worker inserted since the last sync
+            await session.execute(
+                insert(db.AnonymCode).prefix_with("OR IGNORE", dialect="sqlite"),
+                [{"code": code} for code in new_codes],
+            )
+            await session.commit()
+        for code in new_codes:
+            index.add(code)
+    return new_codes, existing
+
+
+async def codes_exist(codes):
+    return {code: await index.contains(code) for code in dict.fromkeys(codes)}
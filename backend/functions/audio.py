@@ -0,0 +1,124 @@
+import struct
+import wave
+from io import BytesIO
+import numpy as np
+from decouple import config
+
+# Sample rate audio is converted to before recognition
+TARGET_SAMPLE_RATE = config("AUDIO_SAMPLE_RATE", default=16000, cast=int)
+# Accepted input formats. The rate comes from the client and sets the size of
+# the resampled buffer, so a bogus one must not get as far as resample()
+MIN_SAMPLE_RATE = 8000
+MAX_SAMPLE_RATE = 192000
+MAX_CHANNELS = 8
+
+# Raw PCM frame: 12 byte little-endian header followed by interleaved samples
+#   magic "PCM1" | format (uint8) | channels (uint8) | reserved (uint16) | sample rate (uint32)
+PCM_MAGIC = b"PCM1"
+PCM_HEADER = struct.Struct("<4sBBHI")
+FORMAT_INT16 = 1
+FORMAT_FLOAT32 = 2
+
+_dtypes = {
+    FORMAT_INT16: np.dtype("<i2"),
+    FORMAT_FLOAT32: np.dtype("<f4"),
+}
+
+
+def _check_format(channels, sample_rate):
+    if not 1 <= channels <= MAX_CHANNELS:
+        raise ValueError(f"Unsupported channel count {channels}")
+    if not MIN_SAMPLE_RATE <= sample_rate <= MAX_SAMPLE_RATE:
+        raise ValueError(f"Unsupported sample rate {sample_rate}")
+
+
+def is_pcm_frame(data):
+    return len(data) >= PCM_HEADER.size and data[:4] == PCM_MAGIC
+
+
+def decode_pcm_frame(data):
+    """Return (float32 samples shaped (frames, channels), sample rate)."""
+    magic, sample_format, channels, _, sample_rate = PCM_HEADER.unpack_from(data)
+    if magic != PCM_MAGIC:
+        raise ValueError("Not a PCM frame")
+    dtype = _dtypes.get(sample_format)
+    if dtype is None:
+        raise ValueError(f"Unsupported sample format {sample_format}")
+    _check_format(channels, sample_rate)
+
+    payload = memoryview(data)[PCM_HEADER.size:]
+    usable = len(payload) - len(payload) % (dtype.itemsize * channels)
+    samples = np.frombuffer(payload[:usable], dtype=dtype).reshape(-1, channels)
+    if sample_format == FORMAT_INT16:
+        samples = samples.astype(np.float32) / 32768.0
+    return samples, sample_rate
+
+
+def encode_pcm_frame(samples, sample_rate, sample_format=FORMAT_INT16):
+    samples = np.asarray(samples)
+    if samples.ndim == 1:
+        samples = samples[:, None]
+    if sample_format == FORMAT_INT16 and samples.dtype.kind == "f":
+        samples = np.clip(samples, -1.0, 1.0) * 32767.0
+    header = PCM_HEADER.pack(PCM_MAGIC, sample_format, samples.shape[1], 0, sample_rate)
+    return header + samples.astype(_dtypes[sample_format]).tobytes()
+
+
+def decode_wav(data):
+    """Return (float32 samples shaped (frames, channels), sample rate) for a WAV file."""
+    try:
+        with wave.open(BytesIO(data), "rb") as wav_file:
+            channels = wav_file.getnchannels()
+            width = wav_file.getsampwidth()
+            sample_rate = wav_file.getframerate()
+            frames = wav_file.readframes(wav_file.getnframes())
+    except (wave.Error, EOFError) as e:
+        raise ValueError(f"Invalid WAV data: {e}")
+    _check_format(channels, sample_rate)
+
+    if width == 1:
+        samples = (np.frombuffer(frames, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif width == 2:
+        samples = np.frombuffer(frames, dtype="<i2").astype(np.float32) / 32768.0
+    elif width == 4:
+        samples = np.frombuffer(frames, dtype="<i4").astype(np.float32) / 2147483648.0
+    else:
+        raise ValueError(f"Unsupported sample width {width}")
+    usable = len(samples) - len(samples) % channels
+    return samples[:usable].reshape(-1, channels), sample_rate
+
+
+def to_mono(samples):
+    if samples.ndim == 1:
+        return samples
+    if samples.shape[1] == 1:
+        return samples[:, 0]
+    return samples.mean(axis=1, dtype=np.float32)
+
+
+def resample(samples, source_rate, target_rate=TARGET_SAMPLE_RATE):
+    # Linear interpolation is plenty for speech headed to a recognizer
+    if source_rate == target_rate or len(samples) == 0:
+        return samples
+    target_length = int(round(len(samples) * target_rate / source_rate))
+    positions = np.arange(target_length, dtype=np.float64) * (source_rate / target_rate)
+    return np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
+
+
+def to_int16(samples):
+    return (np.clip(samples, -1.0, 1.0) * 32767.0).astype("<i2").tobytes()
+
+
+def prepare(samples, sample_rate, target_rate=TARGET_SAMPLE_RATE):
+    """Downmix, resample and convert to 16-bit PCM bytes at target_rate."""
+    return to_int16(resample(to_mono(samples), sample_rate, target_rate)), target_rate
+
+
+def frame_energies(pcm, frame_bytes):
+    """RMS energy of each complete 16-bit frame in pcm, computed in one pass."""
+    samples_per_frame = frame_bytes // 2
+    samples = np.frombuffer(pcm, dtype="<i2", count=(len(pcm) // frame_bytes) * samples_per_frame)
+    if samples.size == 0:
+        return np.empty(0, dtype=np.float64)
+    frames = samples.reshape(-1, samples_per_frame).astype(np.float64)
+    return np.sqrt(np.mean(frames * frames, axis=1))
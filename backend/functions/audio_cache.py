@@ -0,0 +1,154 @@
+import hashlib
+import json
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from decouple import config
+from functions import metrics
+
+TTS_CACHE_DIR = config("TTS_CACHE_DIR", default="tts_cache")
+TTS_CACHE_MAX_BYTES = config("TTS_CACHE_MAX_BYTES", default=200 * 1024 * 1024, cast=int)
+
+
+def cache_key(text, voice_id, model_id, voice_settings):
+    payload = json.dumps([text, voice_id, model_id, voice_settings], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# Content-addressed audio files on disk with size-bounded LRU eviction.
+# Recency is kept in memory and mirrored to mtime so it survives restarts.
+# Every method touches the disk, so callers on the event loop run them in the
+# "tts" executor pool.
+class AudioCache:
+
+    def __init__(self, directory=TTS_CACHE_DIR, max_bytes=TTS_CACHE_MAX_BYTES, extension="mp3"):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.extension = extension
+        self.hits = 0
+        self.misses = 0
+        self._index = None
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.{self.extension}")
+
+    def _load_index(self):
+        if self._index is not None:
+            return
+        entries = []
+        if os.path.isdir(self.directory):
+            for root, _, files in os.walk(self.directory):
+                if os.path.basename(root) == "tmp":
+                    continue
+                for name in files:
+                    if not name.endswith(f".{self.extension}"):
+                        continue
+                    stat = os.stat(os.path.join(root, name))
+                    entries.append((stat.st_mtime, name.rsplit(".", 1)[0], stat.st_size))
+        entries.sort()
+        self._index = OrderedDict((key, size) for _, key, size in entries)
+        self._total = sum(self._index.values())
+
+    def lookup(self, key):
+        with self._lock:
+            self._load_index()
+            if key not in self._index:
+                self.misses += 1
+                metrics.CACHE_LOOKUPS.inc(cache="tts", result="miss")
+                return None
+            path = self.path(key)
+            if not os.path.exists(path):
+                self._total -= self._index.pop(key)
+                self.misses += 1
+                metrics.CACHE_LOOKUPS.inc(cache="tts", result="miss")
+                return None
+            self._index.move_to_end(key)
+            os.utime(path)
+            self.hits += 1
+            metrics.CACHE_LOOKUPS.inc(cache="tts", result="hit")
+            return path
+
+    def writer(self, key):
+        return _CacheWriter(self, key)
+
+    def store(self, key, data):
+        # Write to a temp file first so readers never see a partial file
+        temp_dir = os.path.join(self.directory, "tmp")
+        os.makedirs(temp_dir, exist_ok=True)
+        temp_path = os.path.join(temp_dir, uuid.uuid4().hex)
+        with open(temp_path, "wb") as temp_file:
+            temp_file.write(data)
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._lock:
+            self._load_index()
+            os.replace(temp_path, path)
+            self._total += len(data) - self._index.pop(key, 0)
+            self._index[key] = len(data)
+            self._evict()
+
+    def _evict(self):
+        while self._total > self.max_bytes and len(self._index) > 1:
+            key, size = self._index.popitem(last=False)
+            self._total -= size
+            try:
+                os.remove(self.path(key))
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            self._load_index()
+            return {"entries": len(self._index), "bytes": self._total, "hits": self.hits, "misses": self.misses}
+
+
+# Collects streamed chunks in memory; only a complete response is written
+# to the cache (commit() does the disk I/O), an aborted one is thrown away
+class _CacheWriter:
+
+    def __init__(self, cache, key):
+        self.cache = cache
+        self.key = key
+        self._chunks = []
+
+    def write(self, chunk):
+        self._chunks.append(chunk)
+
+    def commit(self):
+        self.cache.store(self.key, b"".join(self._chunks))
+        self._chunks = []
+
+    def discard(self):
+        self._chunks = []
+
+
+def parse_byte_range(range_header, size):
+    """Parse a single "bytes=start-end" Range header.
+
+    Returns None when there is no usable range (serve the whole file),
+    (start, end) inclusive when it is satisfiable and raises ValueError
+    when it is not.
+    """
+    if not range_header or not range_header.startswith("bytes=") or "," in range_header:
+        return None
+    start_text, _, end_text = range_header[len("bytes="):].strip().partition("-")
+    try:
+        if start_text:
+            start = int(start_text)
+            end = int(end_text) if end_text else size - 1
+        else:
+            # Suffix range: the last N bytes
+            start = max(0, size - int(end_text))
+            end = size - 1
+    except ValueError:
+        return None
+    end = min(end, size - 1)
+    if start > end or start >= size:
+        raise ValueError("Range not satisfiable")
+    return start, end
+
+
+cache = AudioCache()
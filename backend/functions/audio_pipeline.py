@@ -0,0 +1,182 @@
+import asyncio
+from decouple import config
+from functions import executor, logs, metrics, recorder, translator
+
+# Segments waiting between two stages; when full the receive loop stops
+# reading the socket, which pushes back on the client
+PIPELINE_QUEUE_SIZE = config("WS_PIPELINE_QUEUE", default=8, cast=int)
+ASR_CONCURRENCY = config("WS_ASR_CONCURRENCY", default=2, cast=int)
+TRANSLATE_CONCURRENCY = config("WS_TRANSLATE_CONCURRENCY", default=2, cast=int)
+
+logger = logs.get_logger("audio_pipeline")
+
+CANCELLED = metrics.Counter(
+    "chat_ws_audio_cancelled_total", "Audio segments dropped before their result was sent", ["reason"])
+
+
+class Utterance:
+
+    def __init__(self, seq, pcm, sample_rate, sample_width, source_lang, target_lang, kind=None, index=None):
+        self.seq = seq
+        self.pcm = pcm
+        self.sample_rate = sample_rate
+        self.sample_width = sample_width
+        self.source_lang = source_lang
+        self.target_lang = target_lang
+        # kind/index are set for VAD segments ("partial"/"final"), None for whole WAV chunks
+        self.kind = kind
+        self.index = index
+        self.text = None
+        self.translated = None
+        self.error = None
+
+
+# Runs recognition, translation and sending for one /ws/audio connection as
+# separate stages joined by bounded queues, so a slow translation no longer
+# holds up recognition of audio that has already arrived. Results are sent
+# in the order the audio was received, and everything still queued or running
+# is cancelled on disconnect or when the language pair changes.
+class AudioPipeline:
+
+    def __init__(self, send_json, queue_size=PIPELINE_QUEUE_SIZE,
+                 asr_concurrency=ASR_CONCURRENCY, translate_concurrency=TRANSLATE_CONCURRENCY):
+        self._send_json = send_json
+        self.queue_size = queue_size
+        self.asr_concurrency = asr_concurrency
+        self.translate_concurrency = translate_concurrency
+        self._send_lock = asyncio.Lock()
+        self._seq = 0
+        self._tasks = []
+        # Set once a result could not be sent; the client is gone
+        self.closed = False
+        self._start()
+
+    def _start(self):
+        self._asr_queue = asyncio.Queue(self.queue_size)
+        self._translate_queue = asyncio.Queue(self.queue_size)
+        self._results = asyncio.Queue()
+        self._next_seq = self._seq
+        # Set whenever every submitted segment has been delivered
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._sender = asyncio.create_task(self._send_loop())
+        self._tasks = (
+            [asyncio.create_task(self._recognize_loop()) for _ in range(self.asr_concurrency)]
+            + [asyncio.create_task(self._translate_loop()) for _ in range(self.translate_concurrency)]
+            + [self._sender]
+        )
+
+    @property
+    def pending(self):
+        return self._seq - self._next_seq
+
+    async def submit(self, pcm, sample_rate, sample_width, source_lang, target_lang, kind=None, index=None):
+        if self.closed:
+            return
+        utterance = Utterance(self._seq, pcm, sample_rate, sample_width, source_lang, target_lang, kind, index)
+        self._seq += 1
+        self._idle.clear()
+        # Waits while the pipeline is full
+        await self._asr_queue.put(utterance)
+
+    async def send_json(self, payload):
+        async with self._send_lock:
+            await self._send_json(payload)
+
+    async def _recognize_loop(self):
+        while True:
+            utterance = await self._asr_queue.get()
+            try:
+                utterance.text = await executor.run(
+                    "asr", recorder.recognize_pcm, utterance.pcm, utterance.sample_rate,
+                    utterance.sample_width, utterance.source_lang)
+            except Exception as e:
+                utterance.error = e
+            utterance.pcm = None
+            if utterance.text and utterance.error is None:
+                await self._translate_queue.put(utterance)
+            else:
+                # Silence and failures still take their turn so later results are not held back
+                self._results.put_nowait(utterance)
+
+    async def _translate_loop(self):
+        while True:
+            utterance = await self._translate_queue.get()
+            try:
+                # source_lang is what we recognized in, so no detection is needed
+                utterance.translated = await translator.translate_async(
+                    utterance.text, utterance.target_lang, utterance.source_lang)
+            except Exception as e:
+                utterance.error = e
+            self._results.put_nowait(utterance)
+
+    async def _send_loop(self):
+        waiting = {}
+        while True:
+            utterance = await self._results.get()
+            waiting[utterance.seq] = utterance
+            # Stages finish out of order; release results strictly by sequence number
+            while self._next_seq in waiting:
+                try:
+                    await self._deliver(waiting.pop(self._next_seq))
+                except Exception as e:
+                    # The socket is closed; nothing queued can be delivered any more
+                    logger.debug("Stopped sending audio results: %r", e)
+                    self.closed = True
+                    self._idle.set()
+                    return
+                self._next_seq += 1
+            if self._next_seq == self._seq:
+                self._idle.set()
+
+    async def _deliver(self, utterance):
+        error = utterance.error
+        if isinstance(error, executor.Overloaded):
+            await self.send_json({"error": "Server is busy, please try again."})
+        elif isinstance(error, asyncio.TimeoutError):
+            await self.send_json({"error": "Speech processing timed out."})
+        elif error is not None:
+            logger.error("Failed to process audio segment %d: %r", utterance.seq, error)
+        elif not utterance.text:
+            return
+        elif utterance.kind is not None:
+            await self.send_json({
+                "type": utterance.kind,
+                "segment": utterance.index,
+                "transcribedText": utterance.text,
+                "translatedText": utterance.translated,
+            })
+        elif utterance.translated:
+            await self.send_json({
+                "transcribedText": utterance.text,
+                "translatedText": utterance.translated,
+            })
+
+    async def _cancel(self, reason):
+        dropped = self.pending
+        for task in self._tasks:
+            task.cancel()
+        # Cancelling the stage tasks also cancels their executor calls that
+        # have not started yet; ones already running finish and are discarded
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if dropped:
+            CANCELLED.inc(dropped, reason=reason)
+            logger.debug("Dropped %d pending audio segment(s) on %s", dropped, reason)
+
+    async def drain(self):
+        """Wait until the results of everything submitted so far have been sent,
+        or until sending has stopped because the client went away."""
+        idle = asyncio.ensure_future(self._idle.wait())
+        try:
+            await asyncio.wait({idle, self._sender}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            idle.cancel()
+
+    async def reset(self):
+        """Drop everything in flight, e.g. because the language pair changed."""
+        await self._cancel("settings")
+        self._start()
+
+    async def close(self):
+        await self._cancel("disconnect")
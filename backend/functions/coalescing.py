@@ -0,0 +1,25 @@
+import asyncio
+
+
+# Collapses identical concurrent calls onto one underlying call: the first
+# caller for a key starts the work and everyone arriving while it is still
+# running awaits the same result (or exception)
+class SingleFlight:
+
+    def __init__(self):
+        self._inflight = {}
+        self.coalesced = 0
+
+    def __len__(self):
+        return len(self._inflight)
+
+    async def do(self, key, factory):
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # Shielded so one caller going away does not cancel the shared call
+        return await asyncio.shield(task)
@@ -1,12 +1,14 @@
-import os
-import json
 import random
+from decouple import config
+from functions.message_store import store
+
+# Channel used by the speech flow; chat rooms use "room:<roomId>"
+SPEECH_CHANNEL = "speech"
+HISTORY_LIMIT = config("HISTORY_LIMIT", default=5, cast=int)
 
 # Save messages for retrieval later on
-def get_recent_messages():
+def get_recent_messages(channel=SPEECH_CHANNEL, limit=HISTORY_LIMIT):
 
-  # Define the file name
-  file_name = "stored_data.json"
   learn_instruction = {"role": "system", 
                        "content": "You are a Spanish teacher and your name is Rachel, the user is called Shaun. Keep responses under 20 words. "}
   
@@ -25,52 +27,22 @@ def get_recent_messages():
   # Append instruction to message
   messages.append(learn_instruction)
 
-  # Get last messages
-  try:
-    with open(file_name) as user_file:
-      data = json.load(user_file)
-      
-      # Append last 5 rows of data
-      if data:
-        if len(data) < 5:
-          for item in data:
-            messages.append(item)
-        else:
-          for item in data[-5:]:
-            messages.append(item)
-  except:
-    pass
+  # Get last messages for this channel only, straight from the index
+  messages.extend(store.recent(channel, limit))
 
-  
   # Return messages
   return messages
 
 
 # Save messages for retrieval later on
-def store_messages(request_message, response_message):
-
-  # Define the file name
-  file_name = "stored_data.json"
+def store_messages(request_message, response_message, channel=SPEECH_CHANNEL, sender=None):
 
-  # Get recent messages
-  messages = get_recent_messages()[1:]
-
-  # Add messages to data
-  user_message = {"role": "user", "content": request_message}
-  assistant_message = {"role": "assistant", "content": response_message}
-  messages.append(user_message)
-  messages.append(assistant_message)
-
-  # Save the updated file
-  with open(file_name, "w") as f:
-    json.dump(messages, f)
+  # Appended to the store and committed in the background
+  store.append(channel, "user", request_message, sender=sender)
+  store.append(channel, "assistant", response_message or "", sender=sender)
 
 
 # Save messages for retrieval later on
-def reset_messages():
-
-  # Define the file name
-  file_name = "stored_data.json"
+def reset_messages(channel=SPEECH_CHANNEL):
 
-  # Write an empty file
-  open(file_name, "w")
+  store.clear(channel)
@@ -0,0 +1,105 @@
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from decouple import config
+from functions import metrics
+
+
+class Overloaded(Exception):
+    """Raised when a pool already has as many calls in flight as it accepts."""
+
+
+# Thread pool with a cap on queued work and a per-call timeout, so blocking
+# ASR/translation/TTS calls never run on the event loop
+class BoundedPool:
+
+    def __init__(self, name, workers, max_queue, timeout):
+        self.name = name
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.rejected = 0
+        self.timed_out = 0
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"{name}-worker")
+
+    @property
+    def pending(self):
+        return self._pending
+
+    @property
+    def queued(self):
+        return max(0, self._pending - self.workers)
+
+    async def run(self, fn, *args, timeout=None, **kwargs):
+        with self._lock:
+            if self._pending >= self.workers + self.max_queue:
+                self.rejected += 1
+                metrics.EXECUTOR_REJECTED.inc(pool=self.name)
+                raise Overloaded(f"{self.name} pool is saturated")
+            self._pending += 1
+
+        try:
+            # Run in a copy of the caller's context so the trace id follows the call
+            context = contextvars.copy_context()
+            future = self._executor.submit(context.run, functools.partial(fn, *args, **kwargs))
+        except BaseException:
+            self._release(None)
+            raise
+        # Release the slot only once the thread is really done, not when the caller gives up
+        future.add_done_callback(self._release)
+
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout or self.timeout)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            metrics.EXECUTOR_TIMEOUTS.inc(pool=self.name)
+            future.cancel()
+            raise
+
+    def _release(self, _future):
+        with self._lock:
+            self._pending -= 1
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+pools = {
+    "asr": BoundedPool(
+        "asr",
+        workers=config("ASR_WORKERS", default=4, cast=int),
+        max_queue=config("ASR_QUEUE", default=16, cast=int),
+        timeout=config("ASR_TIMEOUT", default=20, cast=float),
+    ),
+    "translation": BoundedPool(
+        "translation",
+        workers=config("TRANSLATION_WORKERS", default=8, cast=int),
+        max_queue=config("TRANSLATION_QUEUE", default=64, cast=int),
+        timeout=config("TRANSLATION_TIMEOUT", default=10, cast=float),
+    ),
+    "tts": BoundedPool(
+        "tts",
+        workers=config("TTS_WORKERS", default=4, cast=int),
+        max_queue=config("TTS_QUEUE", default=16, cast=int),
+        timeout=config("TTS_TIMEOUT", default=30, cast=float),
+    ),
+}
+
+
+metrics.Gauge("chat_executor_queue_depth", "Calls waiting for a free worker", ["pool"],
+              callback=lambda: {(name,): pool.queued for name, pool in pools.items()})
+metrics.Gauge("chat_executor_in_flight", "Calls queued or running", ["pool"],
+              callback=lambda: {(name,): pool.pending for name, pool in pools.items()})
+
+
+async def run(pool_name, fn, *args, **kwargs):
+    return await pools[pool_name].run(fn, *args, **kwargs)
+
+
+def shutdown():
+    for pool in pools.values():
+        pool.shutdown()
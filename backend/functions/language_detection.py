@@ -0,0 +1,69 @@
+import threading
+from functools import lru_cache
+from decouple import config
+from functions import metrics
+
+# Texts up to this length are memoized; chat traffic is mostly short and repetitive
+MEMO_MAX_CHARS = config("DETECT_MEMO_MAX_CHARS", default=64, cast=int)
+MEMO_SIZE = config("DETECT_MEMO_SIZE", default=10000, cast=int)
+
+_init_lock = threading.Lock()
+_profiles_loaded = False
+
+
+def load_profiles():
+    # Profiles are ~50 JSON files; load them once, up front if called at startup.
+    # langdetect publishes its factory before the profiles are in, so other
+    # threads must wait on our own flag rather than on _factory
+    global _profiles_loaded
+    # Imported here so that importing this module stays cheap
+    from langdetect import DetectorFactory, detector_factory
+    if not _profiles_loaded:
+        with _init_lock:
+            if not _profiles_loaded:
+                # langdetect is random unless seeded; the same text must always give the same answer
+                DetectorFactory.seed = 0
+                detector_factory.init_factory()
+                _profiles_loaded = True
+    return detector_factory._factory
+
+
+def _detect(text):
+    detector = load_profiles().create()
+    detector.append(text)
+    return detector.detect()
+
+
+@lru_cache(maxsize=MEMO_SIZE)
+def _detect_memoized(text):
+    return _detect(text)
+
+
+def detect(text):
+    text = text.strip()
+    with metrics.STAGE_SECONDS.time(stage="detect"):
+        if len(text) <= MEMO_MAX_CHARS:
+            return _detect_memoized(text)
+        return _detect(text)
+
+
+def detect_many(texts):
+    """Detect the language of each text, running detection once per distinct text."""
+    results = {}
+    for text in texts:
+        if text not in results:
+            try:
+                results[text] = detect(text)
+            except Exception:
+                results[text] = None
+    return [results[text] for text in texts]
+
+
+def normalize_language(code):
+    # Recognition locales ("en-US", "es-ES") to the plain codes the translator expects
+    if not code:
+        return code
+    language, _, region = code.replace("_", "-").partition("-")
+    if language.lower() == "zh" and region:
+        return f"zh-{region.upper()}"
+    return language.lower()
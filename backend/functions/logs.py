@@ -0,0 +1,88 @@
+import contextvars
+import logging
+import random
+import threading
+import time
+import uuid
+from decouple import config
+
+LOG_LEVEL = config("LOG_LEVEL", default="INFO")
+# Identical messages (same logger and format string) allowed per interval
+LOG_RATE_LIMIT = config("LOG_RATE_LIMIT", default=20, cast=int)
+LOG_RATE_INTERVAL = config("LOG_RATE_INTERVAL", default=10.0, cast=float)
+# Fraction of requests that get a trace id and per-stage debug timings
+TRACE_SAMPLE_RATE = config("TRACE_SAMPLE_RATE", default=0.01, cast=float)
+
+trace_id_var = contextvars.ContextVar("trace_id", default=None)
+
+
+def new_trace_id(force=False):
+    """Start a trace for the current request if it is sampled; returns the id or None."""
+    if force or random.random() < TRACE_SAMPLE_RATE:
+        trace_id = uuid.uuid4().hex[:16]
+    else:
+        trace_id = None
+    trace_id_var.set(trace_id)
+    return trace_id
+
+
+def current_trace_id():
+    return trace_id_var.get()
+
+
+class TraceIdFilter(logging.Filter):
+
+    def filter(self, record):
+        record.trace_id = trace_id_var.get() or "-"
+        return True
+
+
+# Drops repeats of the same message beyond LOG_RATE_LIMIT per interval and
+# reports how many were suppressed once the interval rolls over
+class RateLimitFilter(logging.Filter):
+
+    def __init__(self, limit=LOG_RATE_LIMIT, interval=LOG_RATE_INTERVAL):
+        super().__init__()
+        self.limit = limit
+        self.interval = interval
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            window_start, count, suppressed = self._windows.get(key, (now, 0, 0))
+            if now - window_start >= self.interval:
+                if suppressed:
+                    record.msg = f"{record.msg} ({suppressed} similar messages suppressed)"
+                window_start, count, suppressed = now, 0, 0
+            count += 1
+            allowed = count <= self.limit
+            if not allowed:
+                suppressed += 1
+            self._windows[key] = (window_start, count, suppressed)
+        return allowed
+
+
+_configured = False
+
+
+def setup():
+    global _configured
+    if _configured:
+        return
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s [%(trace_id)s] %(message)s"))
+    handler.addFilter(TraceIdFilter())
+    handler.addFilter(RateLimitFilter())
+    root = logging.getLogger("chat")
+    root.setLevel(LOG_LEVEL.upper())
+    root.addHandler(handler)
+    root.propagate = False
+    _configured = True
+
+
+def get_logger(name):
+    setup()
+    return logging.getLogger(f"chat.{name}")
@@ -0,0 +1,163 @@
+import queue
+import sqlite3
+import threading
+import time
+from decouple import config
+from functions import logs
+
+MESSAGE_DB_PATH = config("MESSAGE_DB", default="messages.db")
+WRITE_BATCH_SIZE = config("MESSAGE_WRITE_BATCH", default=200, cast=int)
+
+logger = logs.get_logger("message_store")
+
+_STOP = object()
+
+
+def encode_cursor(created_at, message_id):
+    return f"{created_at!r}:{message_id}"
+
+
+def decode_cursor(cursor):
+    created_at, _, message_id = cursor.partition(":")
+    return float(created_at), int(message_id)
+
+
+# Append-only message history in SQLite (WAL mode). Writes are queued and
+# committed in batches by one background thread, so request handlers never
+# wait on the disk and concurrent requests never rewrite each other's data.
+class MessageStore:
+
+    def __init__(self, db_path=MESSAGE_DB_PATH, batch_size=WRITE_BATCH_SIZE):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self._queue = queue.Queue()
+        self._local = threading.local()
+        self._writer = None
+        self._start_lock = threading.Lock()
+        self._schema_ready = False
+
+    def _connection(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.db_path, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            if not self._schema_ready:
+                db.execute(
+                    "CREATE TABLE IF NOT EXISTS messages ("
+                    " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                    " channel TEXT NOT NULL,"
+                    " sender TEXT,"
+                    " role TEXT NOT NULL,"
+                    " content TEXT NOT NULL,"
+                    " created_at REAL NOT NULL)"
+                )
+                db.execute(
+                    "CREATE INDEX IF NOT EXISTS idx_messages_channel_time"
+                    " ON messages (channel, created_at, id)"
+                )
+                db.commit()
+                self._schema_ready = True
+            self._local.db = db
+        return db
+
+    def _ensure_writer(self):
+        if self._writer is not None:
+            return
+        with self._start_lock:
+            if self._writer is None:
+                self._connection()
+                self._writer = threading.Thread(target=self._write_loop, name="message-store-writer", daemon=True)
+                self._writer.start()
+
+    def append(self, channel, role, content, sender=None):
+        self._ensure_writer()
+        self._queue.put((channel, sender, role, content, time.time()))
+
+    def _write_loop(self):
+        db = self._connection()
+        while True:
+            item = self._queue.get()
+            batch = []
+            stop = item is _STOP
+            if not stop:
+                batch.append(item)
+            # Group commit: take whatever else is already waiting
+            while not stop and len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                else:
+                    batch.append(item)
+
+            if batch:
+                try:
+                    with db:
+                        db.executemany(
+                            "INSERT INTO messages (channel, sender, role, content, created_at) VALUES (?, ?, ?, ?, ?)",
+                            batch,
+                        )
+                except sqlite3.Error as e:
+                    logger.error("Failed to store %d message(s): %s", len(batch), e)
+            for _ in range(len(batch) + (1 if stop else 0)):
+                self._queue.task_done()
+            if stop:
+                return
+
+    def flush(self):
+        """Block until every queued message has been committed."""
+        if self._writer is not None:
+            self._queue.join()
+
+    def recent(self, channel, limit):
+        rows = self._connection().execute(
+            "SELECT role, content FROM messages WHERE channel = ?"
+            " ORDER BY created_at DESC, id DESC LIMIT ?",
+            (channel, limit),
+        ).fetchall()
+        return [{"role": role, "content": content} for role, content in reversed(rows)]
+
+    def history(self, channel, before=None, limit=50):
+        """Return (messages oldest first, cursor for the next older page or None)."""
+        if before:
+            created_at, message_id = decode_cursor(before)
+            rows = self._connection().execute(
+                "SELECT id, sender, role, content, created_at FROM messages"
+                " WHERE channel = ? AND (created_at, id) < (?, ?)"
+                " ORDER BY created_at DESC, id DESC LIMIT ?",
+                (channel, created_at, message_id, limit + 1),
+            ).fetchall()
+        else:
+            rows = self._connection().execute(
+                "SELECT id, sender, role, content, created_at FROM messages"
+                " WHERE channel = ? ORDER BY created_at DESC, id DESC LIMIT ?",
+                (channel, limit + 1),
+            ).fetchall()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1][4], rows[-1][0])
+        messages = [
+            {"id": message_id, "sender": sender, "role": role, "content": content, "created_at": created_at}
+            for message_id, sender, role, content, created_at in reversed(rows)
+        ]
+        return messages, next_cursor
+
+    def clear(self, channel):
+        self.flush()
+        db = self._connection()
+        with db:
+            db.execute("DELETE FROM messages WHERE channel = ?", (channel,))
+
+    def close(self):
+        if self._writer is not None:
+            self._queue.put(_STOP)
+            self._writer.join()
+            self._writer = None
+
+
+store = MessageStore()
@@ -1,51 +1,83 @@
-import speech_recognition as sr
-from io import BytesIO
+import os
+from concurrent.futures import ThreadPoolExecutor
+from decouple import config
+from functions import logs, metrics, speech_engines
 
-recognizer = sr.Recognizer()
+# Opt-in capture of received audio for debugging, off on the hot path by default
+DEBUG_AUDIO_CAPTURE = config("DEBUG_AUDIO_CAPTURE", default=False, cast=bool)
+DEBUG_AUDIO_DIR = config("DEBUG_AUDIO_DIR", default="debug_audio")
 
-def record_text(file_path, selected_lang):
+logger = logs.get_logger("recorder")
+
+_capture_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="audio-capture")
+
+# Only used to read and trim audio files; recognition itself goes through
+# the configured engine (see functions/speech_engines.py). Created on first
+# use so importing the app doesn't load speech_recognition.
+_recognizer = None
+
+
+def _file_reader():
+    global _recognizer
+    import speech_recognition as sr
+    if _recognizer is None:
+        _recognizer = sr.Recognizer()
+    return sr, _recognizer
+
+def _recognize(pcm, sample_rate, sample_width, selected_lang):
+    with metrics.STAGE_SECONDS.time(stage="asr"):
+        try:
+            text = speech_engines.get_engine().recognize(pcm, sample_rate, sample_width, selected_lang)
+        except speech_engines.RecognitionError:
+            metrics.UPSTREAM_ERRORS.inc(service="asr")
+            raise
+    if not text:
+        logger.info("We could not understand audio")
+    return text
+
+def _recognize_audio(audio, selected_lang):
+    return _recognize(audio.get_raw_data(), audio.sample_rate, audio.sample_width, selected_lang)
+
+# audio_source can be a path or any seekable file-like object (e.g. an upload's spooled file)
+def record_text(audio_source, selected_lang):
     try:
-        with sr.AudioFile(file_path) as source:
+        sr, recognizer = _file_reader()
+        with sr.AudioFile(audio_source) as source:
             recognizer.adjust_for_ambient_noise(source, duration=0.5)
             audio = recognizer.listen(source)
-            text = recognizer.recognize_google(audio, language=selected_lang)
+            text = _recognize_audio(audio, selected_lang)
             return text
-    except sr.RequestError as e:
-        print(f"Could not request results from the speech recognition service; {e}")
-    except sr.UnknownValueError:
-        print("We could not understand audio")
+    except speech_engines.RecognitionError as e:
+        logger.warning("Could not request results from the speech recognition service; %s", e)
     except Exception as e:
-        print(f"An unexpected error occurred during recording: {e}")
+        logger.exception("An unexpected error occurred during recording: %s", e)
     return None
 
-def save_wav_file(audio_stream, file_name="received_audio.wav"):
+def save_wav_file(audio_stream, file_name):
     try:
         # Save the audio stream as a WAV file
         with open(file_name, "wb") as wav_file:
             wav_file.write(audio_stream)
-        print(f"Audio file saved as {file_name}")
+        logger.debug("Audio file saved as %s", file_name)
     except Exception as e:
-        print(f"Failed to save the audio file: {e}")
+        logger.error("Failed to save the audio file: %s", e)
 
 
-def recognize_stream(audio_stream, selected_lang="en"):
-    try:
+# Write a copy of received audio in the background when DEBUG_AUDIO_CAPTURE is set.
+# Files are named per connection so concurrent streams never overwrite each other.
+def capture_audio(audio_stream, connection_id, sequence, extension="wav"):
+    if not DEBUG_AUDIO_CAPTURE:
+        return None
+    os.makedirs(DEBUG_AUDIO_DIR, exist_ok=True)
+    file_name = os.path.join(DEBUG_AUDIO_DIR, f"{connection_id}_{sequence:06d}.{extension}")
+    return _capture_writer.submit(save_wav_file, bytes(audio_stream), file_name)
 
-        save_wav_file(audio_stream, "received_audio.wav")
-        # Convert byte stream to BytesIO object
-        audio_data = BytesIO(audio_stream)
-        
-        # Use BytesIO with AudioFile to get AudioData
-        with sr.AudioFile(audio_data) as source:
-            recognizer.adjust_for_ambient_noise(source, duration=0.5)
-            audio = recognizer.record(source)
-            text = recognizer.recognize_google(audio, language=selected_lang)
-            print(text)
-            return text
-    except sr.RequestError as e:
-        print(f"Could not request results from the speech recognition service; {e}")
-    except sr.UnknownValueError:
-        print("We could not understand audio")
+
+def recognize_pcm(pcm, sample_rate, sample_width, selected_lang="en"):
+    try:
+        return _recognize(pcm, sample_rate, sample_width, selected_lang)
+    except speech_engines.RecognitionError as e:
+        logger.warning("Could not request results from the speech recognition service; %s", e)
     except Exception as e:
-        print(f"An unexpected error occurred during recognition: {e}")
+        logger.exception("An unexpected error occurred during recognition: %s", e)
     return None
@@ -0,0 +1,213 @@
+import asyncio
+import uuid
+from collections import Counter, defaultdict
+from decouple import config
+from functions import logs
+
+DEFAULT_LANGUAGE = "en"
+# Redis URL shared by all workers; empty keeps room state in this process only
+ROOM_STATE_URL = config("ROOM_STATE_URL", default=config("SOCKETIO_MESSAGE_QUEUE", default=""))
+ROOM_STATE_PREFIX = config("ROOM_STATE_PREFIX", default="chat:")
+# A worker's entries disappear this long after it stops refreshing them
+ROOM_STATE_TTL = config("ROOM_STATE_TTL", default=30, cast=int)
+
+logger = logs.get_logger("rooms")
+
+
+# Name of the per-language sub-room that members of a room are grouped into
+def language_room(room_id, language):
+    return f"{room_id}/lang:{language}"
+
+
+# Tracks room membership and language preferences so messages can be fanned
+# out once per language instead of once per member
+class RoomRegistry:
+
+    def __init__(self):
+        self._languages = {}
+        self._rooms_by_sid = defaultdict(set)
+        self._room_languages = defaultdict(Counter)
+
+    def language(self, sid):
+        return self._languages.get(sid, DEFAULT_LANGUAGE)
+
+    def rooms_of(self, sid):
+        return set(self._rooms_by_sid.get(sid, ()))
+
+    def room_sizes(self):
+        return {room_id: sum(counts.values()) for room_id, counts in self._room_languages.items()}
+
+    async def languages_in(self, room_id):
+        return self._local_languages(room_id)
+
+    async def join(self, sid, room_id):
+        if room_id in self._rooms_by_sid[sid]:
+            return False
+        self._rooms_by_sid[sid].add(room_id)
+        self._room_languages[room_id][self.language(sid)] += 1
+        return True
+
+    async def leave(self, sid, room_id):
+        rooms = self._rooms_by_sid.get(sid)
+        if not rooms or room_id not in rooms:
+            return False
+        rooms.discard(room_id)
+        self._decrement(room_id, self.language(sid))
+        return True
+
+    # Returns the previous language so callers can move the sid between sub-rooms
+    async def set_language(self, sid, language):
+        previous = self.language(sid)
+        self._languages[sid] = language
+        if previous != language:
+            for room_id in self._rooms_by_sid.get(sid, ()):
+                self._decrement(room_id, previous)
+                self._room_languages[room_id][language] += 1
+        return previous
+
+    async def remove(self, sid):
+        for room_id in list(self._rooms_by_sid.get(sid, ())):
+            await self.leave(sid, room_id)
+        self._rooms_by_sid.pop(sid, None)
+        self._languages.pop(sid, None)
+
+    async def close(self):
+        pass
+
+    def _local_languages(self, room_id):
+        return [lang for lang, count in self._room_languages.get(room_id, {}).items() if count > 0]
+
+    def _decrement(self, room_id, language):
+        counts = self._room_languages.get(room_id)
+        if counts is None:
+            return
+        counts[language] -= 1
+        if counts[language] <= 0:
+            del counts[language]
+        if not counts:
+            del self._room_languages[room_id]
+
+
+# Registry for several workers or nodes. A sid only ever lives on the worker
+# holding its connection, so membership stays local; what every worker needs
+# is which languages are spoken in a room. Each worker publishes its own
+# per-room language counts to Redis under a key that expires unless it keeps
+# refreshing it, so the members of a crashed worker drop out on their own.
+class SharedRoomRegistry(RoomRegistry):
+
+    def __init__(self, url, prefix=ROOM_STATE_PREFIX, ttl=ROOM_STATE_TTL):
+        super().__init__()
+        self.url = url
+        self.prefix = prefix
+        self.ttl = ttl
+        self.worker_id = uuid.uuid4().hex[:12]
+        self._redis = None
+        self._refresher = None
+
+    def _client(self):
+        if self._redis is None:
+            from redis import asyncio as aioredis
+            self._redis = aioredis.Redis.from_url(self.url, decode_responses=True)
+            self._refresher = asyncio.get_running_loop().create_task(self._refresh_loop())
+        return self._redis
+
+    def _counts_key(self, room_id, worker_id):
+        return f"{self.prefix}room:{room_id}:languages:{worker_id}"
+
+    def _workers_key(self, room_id):
+        return f"{self.prefix}room:{room_id}:workers"
+
+    async def _publish(self, *room_ids):
+        # Writes absolute counts rather than increments, so a lost or
+        # reordered write is corrected by the next one
+        async with self._client().pipeline(transaction=False) as pipe:
+            for room_id in room_ids:
+                key = self._counts_key(room_id, self.worker_id)
+                counts = self._room_languages.get(room_id)
+                pipe.delete(key)
+                if counts:
+                    pipe.hset(key, mapping=dict(counts))
+                    pipe.expire(key, self.ttl)
+                    pipe.sadd(self._workers_key(room_id), self.worker_id)
+                    pipe.expire(self._workers_key(room_id), self.ttl)
+                else:
+                    pipe.srem(self._workers_key(room_id), self.worker_id)
+            await pipe.execute()
+
+    async def _try_publish(self, *room_ids):
+        from redis.exceptions import RedisError
+        try:
+            await self._publish(*room_ids)
+        except (RedisError, OSError) as e:
+            # The refresher writes everything again shortly
+            logger.warning("Could not publish room state: %r", e)
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(self.ttl / 3)
+            if self._room_languages:
+                await self._try_publish(*self._room_languages)
+
+    async def languages_in(self, room_id):
+        from redis.exceptions import RedisError
+        try:
+            redis = self._client()
+            workers = await redis.smembers(self._workers_key(room_id))
+            if not workers:
+                return self._local_languages(room_id)
+            async with redis.pipeline(transaction=False) as pipe:
+                for worker_id in workers:
+                    pipe.hgetall(self._counts_key(room_id, worker_id))
+                results = await pipe.execute()
+        except (RedisError, OSError) as e:
+            logger.warning("Room state unavailable, using local members only: %r", e)
+            return self._local_languages(room_id)
+
+        totals = Counter(self._room_languages.get(room_id, {}))
+        stale = []
+        for worker_id, counts in zip(workers, results):
+            if worker_id == self.worker_id:
+                continue  # Our own counts are already in totals and always fresher
+            if not counts:
+                stale.append(worker_id)
+            for language, count in counts.items():
+                totals[language] += int(count)
+        if stale:
+            try:
+                await redis.srem(self._workers_key(room_id), *stale)
+            except (RedisError, OSError):
+                pass
+        return [language for language, count in totals.items() if count > 0]
+
+    async def join(self, sid, room_id):
+        joined = await super().join(sid, room_id)
+        if joined:
+            await self._try_publish(room_id)
+        return joined
+
+    async def leave(self, sid, room_id):
+        left = await super().leave(sid, room_id)
+        if left:
+            await self._try_publish(room_id)
+        return left
+
+    async def set_language(self, sid, language):
+        previous = await super().set_language(sid, language)
+        if previous != language and self._rooms_by_sid.get(sid):
+            await self._try_publish(*self._rooms_by_sid[sid])
+        return previous
+
+    async def close(self):
+        if self._redis is None:
+            return
+        self._refresher.cancel()
+        room_ids = list(self._room_languages)
+        self._room_languages.clear()
+        if room_ids:
+            await self._try_publish(*room_ids)
+        await self._redis.aclose()
+        self._redis = None
+
+
+def create_registry(url=ROOM_STATE_URL):
+    return SharedRoomRegistry(url) if url else RoomRegistry()
@@ -0,0 +1,223 @@
+import abc
+import json
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
+import numpy as np
+from decouple import config
+from functions import logs
+
+# Which recognizer turns audio into text: "google" (Web Speech API, needs
+# network), "vosk" (local models, pip install vosk) or "stub" (offline,
+# deterministic, for tests and load runs)
+SPEECH_ENGINE = config("SPEECH_ENGINE", default="google")
+# Worker processes for recognition. "auto" uses one per core for engines that
+# are CPU bound and runs network-bound engines in the ASR threads instead
+ASR_PROCESSES = config("ASR_PROCESSES", default="auto")
+VOSK_MODEL_PATH = config("VOSK_MODEL_PATH", default="models/vosk")
+STUB_SPEECH_TEXT = config("STUB_SPEECH_TEXT", default="hello how are you")
+
+logger = logs.get_logger("speech_engines")
+
+
+class RecognitionError(Exception):
+    """The engine could not be reached or failed; not raised for audio it simply could not understand."""
+
+
+# Interface every engine implements. load() runs once per process before the
+# first recognize(); recognize() takes raw little-endian PCM and returns the
+# text, or None when nothing intelligible was said.
+class SpeechEngine(abc.ABC):
+    name = None
+    cpu_bound = False
+
+    def load(self):
+        pass
+
+    @abc.abstractmethod
+    def recognize(self, pcm, sample_rate, sample_width, language):
+        pass
+
+    def close(self):
+        pass
+
+
+class GoogleEngine(SpeechEngine):
+    name = "google"
+
+    def load(self):
+        import speech_recognition as sr
+        self._sr = sr
+        self._recognizer = sr.Recognizer()
+
+    def recognize(self, pcm, sample_rate, sample_width, language):
+        audio = self._sr.AudioData(pcm, sample_rate, sample_width)
+        try:
+            return self._recognizer.recognize_google(audio, language=language)
+        except self._sr.UnknownValueError:
+            return None
+        except self._sr.RequestError as e:
+            raise RecognitionError(str(e)) from e
+
+
+class VoskEngine(SpeechEngine):
+    name = "vosk"
+    cpu_bound = True
+
+    def __init__(self, model_path=VOSK_MODEL_PATH):
+        self.model_path = model_path
+        self._model = None
+
+    def load(self):
+        try:
+            import vosk
+        except ImportError as e:
+            raise RuntimeError("SPEECH_ENGINE=vosk needs the vosk package (pip install vosk)") from e
+        vosk.SetLogLevel(-1)
+        self._vosk = vosk
+        # A model is one language; the language argument of recognize() is not used
+        self._model = vosk.Model(self.model_path)
+
+    def recognize(self, pcm, sample_rate, sample_width, language):
+        if sample_width != 2:
+            raise RecognitionError("Vosk needs 16-bit PCM")
+        recognizer = self._vosk.KaldiRecognizer(self._model, sample_rate)
+        recognizer.AcceptWaveform(pcm)
+        return json.loads(recognizer.FinalResult()).get("text") or None
+
+
+class StubEngine(SpeechEngine):
+    name = "stub"
+
+    def __init__(self, text=STUB_SPEECH_TEXT, threshold=300):
+        self.text = text
+        self.threshold = threshold
+
+    def recognize(self, pcm, sample_rate, sample_width, language):
+        if sample_width != 2 or not pcm:
+            return None
+        samples = np.frombuffer(pcm, dtype="<i2").astype(np.float32)
+        # Same answer for the same audio: text for anything louder than the threshold
+        if np.sqrt(np.mean(samples * samples)) < self.threshold:
+            return None
+        return self.text
+
+
+ENGINES = {engine.name: engine for engine in (GoogleEngine, VoskEngine, StubEngine)}
+
+
+def create_engine(name=SPEECH_ENGINE):
+    try:
+        return ENGINES[name]()
+    except KeyError:
+        raise ValueError(f"Unknown speech engine {name!r}, expected one of {sorted(ENGINES)}") from None
+
+
+# --- Worker process side ---
+
+_worker_engine = None
+
+
+def _init_worker(name):
+    global _worker_engine
+    _worker_engine = create_engine(name)
+    _worker_engine.load()
+
+
+def _worker_ready():
+    return os.getpid()
+
+
+def _recognize_shared(segment_name, size, sample_rate, sample_width, language):
+    segment = shared_memory.SharedMemory(name=segment_name)
+    try:
+        pcm = bytes(segment.buf[:size])
+    finally:
+        segment.close()
+    return _worker_engine.recognize(pcm, sample_rate, sample_width, language)
+
+
+# Runs an engine in a pool of processes that each load the model once in
+# their initializer, so CPU-heavy recognition scales across cores instead of
+# contending for the GIL. Audio goes through a shared-memory segment rather
+# than being pickled through the pool's pipe.
+class ProcessEngine(SpeechEngine):
+
+    def __init__(self, name, processes):
+        self.name = name
+        self.processes = processes
+        self._pool = None
+
+    def load(self):
+        # spawn, not fork: the server process has threads and open sockets
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.processes,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.name,),
+        )
+        # Start every worker now so no request waits for a process or a model load
+        for future in wait([self._pool.submit(_worker_ready) for _ in range(self.processes)]).done:
+            future.result()
+        logger.info("Started %d %s recognition process(es)", self.processes, self.name)
+
+    def recognize(self, pcm, sample_rate, sample_width, language):
+        if not pcm:
+            return None
+        segment = shared_memory.SharedMemory(create=True, size=len(pcm))
+        try:
+            segment.buf[:len(pcm)] = pcm
+            future = self._pool.submit(_recognize_shared, segment.name, len(pcm), sample_rate, sample_width, language)
+            return future.result()
+        finally:
+            segment.close()
+            segment.unlink()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+def process_count(engine, setting=ASR_PROCESSES):
+    if str(setting).lower() == "auto":
+        return (os.cpu_count() or 1) if engine.cpu_bound else 0
+    return int(setting)
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    """The configured engine, loaded on first use."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                engine = create_engine()
+                processes = process_count(engine)
+                if processes > 0:
+                    engine = ProcessEngine(engine.name, processes)
+                engine.load()
+                _engine = engine
+    return _engine
+
+
+def use_engine(engine):
+    """Replace the configured engine, e.g. with a fake in benchmarks."""
+    global _engine
+    with _engine_lock:
+        if _engine is not None and _engine is not engine:
+            _engine.close()
+        _engine = engine
+
+
+def shutdown():
+    global _engine
+    with _engine_lock:
+        if _engine is not None:
+            _engine.close()
+            _engine = None
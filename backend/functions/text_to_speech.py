@@ -1,45 +1,138 @@
-import requests
 from decouple import config
+import time
+from functions import audio_cache, executor, logs, metrics
 
-ELEVEN_LABS_API_KEY = config("ELEVEN_LABS_API_KEY")
-
-# Eleven Labs
-# Convert text to speech
-def convert_text_to_speech(message,selectedGender):
-  body = {
-    "text": message,
-    "model_id": "eleven_multilingual_v2",
-    "voice_settings": {
-        "stability": 0,
-        "similarity_boost": 0
+# Missing key only fails TTS requests, not the import of the whole app
+ELEVEN_LABS_API_KEY = config("ELEVEN_LABS_API_KEY", default="")
+# Point this at a local fake server to exercise the TTS path offline
+ELEVEN_LABS_BASE_URL = config("ELEVEN_LABS_BASE_URL", default="https://api.elevenlabs.io")
+TTS_MAX_CONNECTIONS = config("TTS_MAX_CONNECTIONS", default=20, cast=int)
+TTS_TIMEOUT = config("TTS_TIMEOUT", default=30, cast=float)
+
+logger = logs.get_logger("text_to_speech")
+
+MODEL_ID = "eleven_multilingual_v2"
+VOICE_SETTINGS = {
+    "stability": 0,
+    "similarity_boost": 0
+}
+
+voice_shaun = "mTSvIrm2hmcnOvb21nW2"
+voice_rachel = "21m00Tcm4TlvDq8ikWAM"
+voice_antoni = "ErXwobaYiN019PkySvjV"
+voice_default = "iP95p4xoKVk53GoZ742B"
+
+
+class TextToSpeechError(Exception):
+    pass
+
+
+# No free connection to ElevenLabs within the pool timeout
+class TextToSpeechBusy(TextToSpeechError):
+    pass
+
+
+class TextToSpeechTimeout(TextToSpeechError):
+    pass
+
+
+def voice_for(selectedGender):
+    if (selectedGender =="F"):
+        return voice_rachel
+    return voice_default
+
+
+def speech_key(message, selectedGender):
+    return audio_cache.cache_key(message, voice_for(selectedGender), MODEL_ID, VOICE_SETTINGS)
+
+
+def _request(message, selectedGender):
+    if not ELEVEN_LABS_API_KEY:
+        raise TextToSpeechError("ELEVEN_LABS_API_KEY is not set")
+    body = {
+        "text": message,
+        "model_id": MODEL_ID,
+        "voice_settings": VOICE_SETTINGS
     }
-  }
-
-  voice_shaun = "mTSvIrm2hmcnOvb21nW2"
-  voice_rachel = "21m00Tcm4TlvDq8ikWAM"
-  voice_antoni = "ErXwobaYiN019PkySvjV"
-  voice = ""
-  if (selectedGender =="F"):
-      voice=voice_rachel
-  else:
-      voice = "iP95p4xoKVk53GoZ742B"
-
-  # Construct request headers and url
-  headers = { "xi-api-key": ELEVEN_LABS_API_KEY, "Content-Type": "application/json", "accept": "audio/mpeg" }
-  endpoint = f"https://api.elevenlabs.io/v1/text-to-speech/{voice}"
-
-  try:
-      # Make the POST request to the Eleven Labs API
-      response = requests.post(endpoint, json=body, headers=headers)
-
-      # Check if the request was successful
-      if response.status_code == 200:
-          # Return the audio content
-          return response.content
-      else:
-          print(f"Request failed with status code: {response.status_code}")
-          return None
-
-  except Exception as e:
-      print(f"An error occurred: {e}")
-      return None
\ No newline at end of file
+    headers = { "xi-api-key": ELEVEN_LABS_API_KEY, "Content-Type": "application/json", "accept": "audio/mpeg" }
+    endpoint = f"{ELEVEN_LABS_BASE_URL}/v1/text-to-speech/{voice_for(selectedGender)}"
+    return endpoint, body, headers
+
+
+# Shared keep-alive connections instead of a new TLS handshake per request
+_client = None
+
+
+def get_client():
+    global _client
+    if _client is None:
+        # Imported on first use so the app starts without loading httpx
+        import httpx
+        _client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=TTS_MAX_CONNECTIONS, max_keepalive_connections=TTS_MAX_CONNECTIONS),
+            timeout=httpx.Timeout(TTS_TIMEOUT, connect=5.0),
+        )
+    return _client
+
+
+async def warm_up():
+    # Opens a pooled connection (DNS, TCP and TLS) so the first real request
+    # doesn't pay for it; the response itself is irrelevant
+    await get_client().get(f"{ELEVEN_LABS_BASE_URL}/v1/models", headers={"xi-api-key": ELEVEN_LABS_API_KEY})
+
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+async def stream_speech(message, selectedGender, cache=audio_cache.cache):
+    """Start synthesis and return an async iterator over the MP3 chunks.
+
+    Raises TextToSpeechError before anything is sent if the upstream call
+    fails, so the caller can still answer with a proper error status. The
+    chunks are written to the audio cache as they are forwarded and the
+    entry is kept only if the whole response arrived.
+    """
+    endpoint, body, headers = _request(message, selectedGender)
+    client = get_client()
+    started = time.perf_counter()
+    import httpx
+    try:
+        response = await client.send(client.build_request("POST", endpoint, json=body, headers=headers), stream=True)
+    except httpx.HTTPError as e:
+        metrics.UPSTREAM_ERRORS.inc(service="tts")
+        if isinstance(e, httpx.PoolTimeout):
+            raise TextToSpeechBusy(str(e)) from e
+        if isinstance(e, httpx.TimeoutException):
+            raise TextToSpeechTimeout(str(e)) from e
+        raise
+    if response.status_code != 200:
+        await response.aclose()
+        metrics.UPSTREAM_ERRORS.inc(service="tts")
+        raise TextToSpeechError(f"Request failed with status code: {response.status_code}")
+    # Time to first byte is what the user waits for
+    metrics.STAGE_SECONDS.observe(time.perf_counter() - started, stage="tts")
+
+    async def chunks():
+        writer = cache.writer(speech_key(message, selectedGender))
+        complete = False
+        try:
+            async for chunk in response.aiter_bytes():
+                writer.write(chunk)
+                yield chunk
+            complete = True
+        finally:
+            await response.aclose()
+            if complete:
+                try:
+                    # Disk I/O stays off the event loop
+                    await executor.run("tts", writer.commit)
+                except Exception as e:
+                    logger.warning("Could not cache speech: %r", e)
+            else:
+                writer.discard()
+
+    return chunks()
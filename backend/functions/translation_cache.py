@@ -0,0 +1,183 @@
+import asyncio
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from decouple import config
+from functions import logs, metrics
+
+CACHE_DB_PATH = config("TRANSLATION_CACHE_DB", default="main.db")
+CACHE_MAX_ENTRIES = config("TRANSLATION_CACHE_SIZE", default=5000, cast=int)
+CACHE_TTL_SECONDS = config("TRANSLATION_CACHE_TTL", default=7 * 24 * 3600, cast=int)
+# The SQLite table is trimmed to this many rows, oldest first
+CACHE_MAX_ROWS = config("TRANSLATION_CACHE_ROWS", default=200000, cast=int)
+CACHE_PURGE_INTERVAL = config("TRANSLATION_CACHE_PURGE_INTERVAL", default=3600, cast=float)
+# How long a write waits for another connection to main.db before giving up
+CACHE_BUSY_TIMEOUT = config("TRANSLATION_CACHE_BUSY_TIMEOUT", default=5.0, cast=float)
+
+logger = logs.get_logger("translation_cache")
+
+_whitespace = re.compile(r"\s+")
+
+
+def normalize_text(text):
+    # Collapse whitespace so "hello " and "hello" share one entry
+    return _whitespace.sub(" ", text).strip()
+
+
+# Two-tier translation cache: in-process LRU in front of a SQLite table.
+# The lock only guards the LRU; SQLite is read and written outside it through
+# one WAL connection per thread, so a slow disk never blocks memory hits.
+class TranslationCache:
+
+    def __init__(self, db_path=CACHE_DB_PATH, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS,
+                 max_rows=CACHE_MAX_ROWS):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.max_rows = max_rows
+        self.ttl = ttl
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._schema_ready = False
+
+    def _connection(self):
+        # Open lazily so importing the module never touches the disk
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.db_path, timeout=CACHE_BUSY_TIMEOUT)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            if not self._schema_ready:
+                db.execute(
+                    "CREATE TABLE IF NOT EXISTS translation_cache ("
+                    " text TEXT NOT NULL,"
+                    " source_lang TEXT NOT NULL,"
+                    " target_lang TEXT NOT NULL,"
+                    " translated TEXT NOT NULL,"
+                    " created_at REAL NOT NULL,"
+                    " PRIMARY KEY (text, source_lang, target_lang))"
+                )
+                db.execute(
+                    "CREATE INDEX IF NOT EXISTS translation_cache_created_at"
+                    " ON translation_cache (created_at)"
+                )
+                db.commit()
+                self._schema_ready = True
+            self._local.db = db
+        return db
+
+    def key(self, text, source_lang, target_lang):
+        return (normalize_text(text), source_lang or "auto", target_lang)
+
+    def get(self, text, source_lang, target_lang):
+        key = self.key(text, source_lang, target_lang)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                translated, created_at = entry
+                if now - created_at < self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    metrics.CACHE_LOOKUPS.inc(cache="translation", result="hit")
+                    return translated
+                del self._entries[key]
+
+        # Fall back to the persistent table
+        try:
+            row = self._connection().execute(
+                "SELECT translated, created_at FROM translation_cache"
+                " WHERE text = ? AND source_lang = ? AND target_lang = ?",
+                key,
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning("Translation cache lookup failed: %s", e)
+            row = None
+
+        with self._lock:
+            if row is not None and now - row[1] < self.ttl:
+                # A put() may have landed while the row was being read
+                entry = self._entries.get(key)
+                if entry is None or entry[1] < row[1]:
+                    self._remember(key, row[0], row[1])
+                self.disk_hits += 1
+                metrics.CACHE_LOOKUPS.inc(cache="translation", result="disk_hit")
+                return row[0]
+
+            self.misses += 1
+            metrics.CACHE_LOOKUPS.inc(cache="translation", result="miss")
+            return None
+
+    def put(self, text, source_lang, target_lang, translated):
+        if not translated:
+            return
+        key = self.key(text, source_lang, target_lang)
+        now = time.time()
+        with self._lock:
+            self._remember(key, translated, now)
+        try:
+            db = self._connection()
+            db.execute(
+                "INSERT OR REPLACE INTO translation_cache"
+                " (text, source_lang, target_lang, translated, created_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (*key, translated, now),
+            )
+            db.commit()
+        except sqlite3.Error as e:
+            logger.warning("Translation cache write failed: %s", e)
+
+    def _remember(self, key, translated, created_at):
+        self._entries[key] = (translated, created_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def purge(self):
+        """Delete expired entries, then the oldest rows beyond max_rows. Returns the rows deleted."""
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            for key in [k for k, (_, created_at) in self._entries.items() if created_at < cutoff]:
+                del self._entries[key]
+        db = self._connection()
+        deleted = db.execute("DELETE FROM translation_cache WHERE created_at < ?", (cutoff,)).rowcount
+        excess = db.execute("SELECT COUNT(*) FROM translation_cache").fetchone()[0] - self.max_rows
+        if excess > 0:
+            deleted += db.execute(
+                "DELETE FROM translation_cache WHERE rowid IN"
+                " (SELECT rowid FROM translation_cache ORDER BY created_at LIMIT ?)",
+                (excess,),
+            ).rowcount
+        db.commit()
+        return deleted
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            }
+
+
+cache = TranslationCache()
+
+
+async def purge_periodically(interval=CACHE_PURGE_INTERVAL):
+    # Started from the app lifespan; the first purge runs right away
+    while True:
+        try:
+            deleted = await asyncio.to_thread(cache.purge)
+            if deleted:
+                logger.info("Purged %d translation cache row(s)", deleted)
+        except sqlite3.Error as e:
+            logger.warning("Translation cache purge failed: %s", e)
+        await asyncio.sleep(interval)
@@ -1,15 +1,100 @@
-from translate import Translator
-from langdetect import detect
+import asyncio
+from decouple import config
+from functions import coalescing, executor, language_detection, logs, metrics
+from functions.translation_cache import cache
 
-def translate_textt(text,language):
+BATCH_CONCURRENCY = config("TRANSLATION_BATCH_CONCURRENCY", default=8, cast=int)
+
+logger = logs.get_logger("translator")
+
+# translate.Translator, imported on first use (it pulls in requests)
+Translator = None
+
+
+def _translator_class():
+    global Translator
+    if Translator is None:
+        from translate import Translator as translator_class
+        Translator = translator_class
+    return Translator
+
+# source_lang skips detection when the caller already knows it (e.g. selectedFrom)
+def translate_textt(text,language,source_lang=None):
     
     try:
-        lang_text = detect(text)
-        translator = Translator(from_lang=lang_text, to_lang=language)
+        if source_lang:
+            lang_text = language_detection.normalize_language(source_lang)
+        else:
+            lang_text = language_detection.detect(text)
+        if lang_text == language_detection.normalize_language(language):
+            return text
+        translator = _translator_class()(from_lang=lang_text, to_lang=language)
         
-        result = translator.translate(text)
+        with metrics.STAGE_SECONDS.time(stage="translate"):
+            try:
+                result = translator.translate(text)
+            except Exception:
+                metrics.UPSTREAM_ERRORS.inc(service="translation")
+                raise
         return result
     except Exception as e:
-        print(f"An error occurred while translating: {e}")
+        logger.warning("An error occurred while translating: %s", e)
         return None
-    
+
+
+# Same as translate_textt but served from the translation cache when possible
+def translate_cached(text, language, source_lang=None):
+    if not text:
+        return text
+
+    source_lang = language_detection.normalize_language(source_lang)
+    cached = cache.get(text, source_lang, language)
+    if cached is not None:
+        return cached
+
+    result = translate_textt(text, language, source_lang)
+    cache.put(text, source_lang, language, result)
+    return result
+
+
+_inflight = coalescing.SingleFlight()
+
+
+# Async entry point used by the request handlers: runs in the translation
+# pool and coalesces identical requests that are already in flight
+async def translate_async(text, language, source_lang=None):
+    key = cache.key(text or "", language_detection.normalize_language(source_lang), language)
+    return await _inflight.do(key, lambda: executor.run("translation", translate_cached, text, language, source_lang))
+
+
+async def translate_batch(items, concurrency=BATCH_CONCURRENCY):
+    """Translate (text, language, source_lang) items.
+
+    Duplicates are translated once, unique items run concurrently up to
+    `concurrency`, and the result list matches the input order with one
+    (translated_text, error) pair per item.
+    """
+    keys = [cache.key(text or "", language_detection.normalize_language(source_lang), language)
+            for text, language, source_lang in items]
+    unique = dict(zip(keys, items))
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_one(item):
+        text, language, source_lang = item
+        async with semaphore:
+            try:
+                result = await translate_async(text, language, source_lang)
+            except executor.Overloaded:
+                return None, "Server is busy, please try again"
+            except asyncio.TimeoutError:
+                return None, "Translation timed out"
+            except Exception as e:
+                logger.warning("An error occurred while translating: %s", e)
+                return None, "Translation failed"
+        if result is None and text:
+            return None, "Translation failed"
+        return result, None
+
+    results = await asyncio.gather(*(run_one(item) for item in unique.values()))
+    by_key = dict(zip(unique.keys(), results))
+    return [by_key[key] for key in keys]
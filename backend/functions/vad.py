@@ -0,0 +1,196 @@
+from collections import deque
+from decouple import config
+from functions import audio
+
+ENERGY_THRESHOLD = config("VAD_ENERGY_THRESHOLD", default=300, cast=float)
+FRAME_MS = config("VAD_FRAME_MS", default=30, cast=int)
+SILENCE_MS = config("VAD_SILENCE_MS", default=600, cast=int)
+MIN_SPEECH_MS = config("VAD_MIN_SPEECH_MS", default=250, cast=int)
+MAX_SEGMENT_SECONDS = config("VAD_MAX_SEGMENT_SECONDS", default=8, cast=float)
+PREROLL_MS = config("VAD_PREROLL_MS", default=300, cast=int)
+CALIBRATION_MS = config("VAD_CALIBRATION_MS", default=500, cast=int)
+
+
+# Fixed-capacity byte buffer; once full, appending overwrites the oldest audio
+class RingBuffer:
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._data = bytearray(capacity)
+        self._start = 0
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def full(self):
+        return self._size == self.capacity
+
+    def append(self, chunk):
+        chunk = memoryview(chunk)
+        if len(chunk) >= self.capacity:
+            self._data[:] = chunk[-self.capacity:]
+            self._start = 0
+            self._size = self.capacity
+            return
+        end = (self._start + self._size) % self.capacity
+        first = min(len(chunk), self.capacity - end)
+        self._data[end:end + first] = chunk[:first]
+        self._data[:len(chunk) - first] = chunk[first:]
+        overflow = self._size + len(chunk) - self.capacity
+        if overflow > 0:
+            self._start = (self._start + overflow) % self.capacity
+            self._size = self.capacity
+        else:
+            self._size += len(chunk)
+
+    def read(self):
+        end = self._start + self._size
+        if end <= self.capacity:
+            return bytes(self._data[self._start:end])
+        return bytes(self._data[self._start:]) + bytes(self._data[:end - self.capacity])
+
+    def clear(self):
+        self._start = 0
+        self._size = 0
+
+
+# Per-connection speech/silence threshold. It is calibrated once from the
+# first CALIBRATION_MS of audio and then follows the background noise on
+# silent frames, the same way speech_recognition's dynamic threshold does.
+class NoiseFloor:
+
+    def __init__(self, initial=ENERGY_THRESHOLD, calibration_ms=CALIBRATION_MS, ratio=1.5, damping=0.15):
+        self.threshold = initial
+        self.minimum = initial / 2
+        self.calibrated = False
+        self.ratio = ratio
+        self.damping = damping
+        self._calibration_ms = calibration_ms
+        self._seen_ms = 0.0
+        self._energy_sum = 0.0
+        self._frames = 0
+
+    def is_speech(self, energy):
+        return energy >= self.threshold
+
+    def observe(self, energy, frame_seconds):
+        if not self.calibrated:
+            self._energy_sum += energy
+            self._frames += 1
+            self._seen_ms += frame_seconds * 1000
+            if self._seen_ms >= self._calibration_ms:
+                self.threshold = max(self.minimum, self._energy_sum / self._frames * self.ratio)
+                self.calibrated = True
+        elif not self.is_speech(energy):
+            damping = self.damping ** frame_seconds
+            target = max(self.minimum, energy * self.ratio)
+            self.threshold = self.threshold * damping + target * (1 - damping)
+
+    def contains_speech(self, pcm, sample_rate, frame_ms=FRAME_MS):
+        frame_bytes = int(sample_rate * frame_ms / 1000) * 2
+        energies = audio.frame_energies(pcm, frame_bytes)
+        for energy in energies:
+            self.observe(energy, frame_ms / 1000)
+        return bool(len(energies)) and bool((energies >= self.threshold).any())
+
+
+# Energy-based voice activity detection over 16-bit mono PCM. Audio is fed in
+# arbitrary chunks and cut into utterances at pauses; each utterance is
+# returned exactly once so only new audio is ever recognized.
+class Segmenter:
+
+    def __init__(self, sample_rate, sample_width=2, noise_floor=None, frame_ms=FRAME_MS,
+                 silence_ms=SILENCE_MS, min_speech_ms=MIN_SPEECH_MS,
+                 max_segment_seconds=MAX_SEGMENT_SECONDS, preroll_ms=PREROLL_MS):
+        if sample_width != 2:
+            raise ValueError("Streaming recognition expects 16-bit PCM audio")
+        self.sample_rate = sample_rate
+        self.sample_width = sample_width
+        self.noise_floor = noise_floor or NoiseFloor()
+        self.frame_seconds = frame_ms / 1000
+        self.frame_bytes = int(sample_rate * frame_ms / 1000) * sample_width
+        self._silence_frames = max(1, silence_ms // frame_ms)
+        self._min_speech_frames = max(1, min_speech_ms // frame_ms)
+        self._pending = bytearray()
+        self._preroll = deque(maxlen=max(1, preroll_ms // frame_ms))
+        self._segment = RingBuffer(int(sample_rate * max_segment_seconds) * sample_width)
+        self._in_speech = False
+        self._speech_frames = 0
+        self._silent_run = 0
+        self._partial_sent = False
+        self.segment_index = 0
+
+    def feed(self, pcm):
+        """Consume PCM bytes and return a list of (kind, index, pcm) segments,
+        where kind is "partial" for an utterance cut at the length limit and
+        "final" for one that ended at a pause."""
+        self._pending += pcm
+        events = []
+        frame_bytes = self.frame_bytes
+        energies = audio.frame_energies(self._pending, frame_bytes)
+        for i, energy in enumerate(energies):
+            frame = bytes(self._pending[i * frame_bytes:(i + 1) * frame_bytes])
+            speech = self.noise_floor.is_speech(energy)
+            self.noise_floor.observe(energy, self.frame_seconds)
+            event = self._process_frame(frame, speech)
+            if event is not None:
+                events.append(event)
+        del self._pending[:len(energies) * frame_bytes]
+        return events
+
+    def flush(self):
+        """Return whatever utterance is in progress, e.g. when the client stops."""
+        if self._in_speech and (self._speech_frames >= self._min_speech_frames or self._partial_sent):
+            return self._cut("final")
+        self._reset()
+        return None
+
+    def _process_frame(self, frame, speech):
+        if not self._in_speech:
+            if not speech:
+                self._preroll.append(frame)
+                return None
+            # Keep a little audio from before the onset so first syllables are not clipped
+            self._in_speech = True
+            for buffered in self._preroll:
+                self._segment.append(buffered)
+            self._preroll.clear()
+
+        self._segment.append(frame)
+        if speech:
+            self._speech_frames += 1
+            self._silent_run = 0
+        else:
+            self._silent_run += 1
+
+        if self._silent_run >= self._silence_frames:
+            if self._speech_frames >= self._min_speech_frames or self._partial_sent:
+                return self._cut("final")
+            self._reset()
+            return None
+
+        # Long utterance without a pause: hand over what we have and keep listening
+        if self._segment.full:
+            return self._cut("partial", keep_speaking=True)
+        return None
+
+    def _cut(self, kind, keep_speaking=False):
+        event = (kind, self.segment_index, self._segment.read())
+        self._segment.clear()
+        if keep_speaking:
+            self._speech_frames = 0
+            self._silent_run = 0
+            self._partial_sent = True
+        else:
+            self.segment_index += 1
+            self._reset()
+        return event
+
+    def _reset(self):
+        self._segment.clear()
+        self._in_speech = False
+        self._speech_frames = 0
+        self._silent_run = 0
+        self._partial_sent = False
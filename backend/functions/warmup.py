@@ -0,0 +1,82 @@
+import asyncio
+import time
+from decouple import config
+from functions import database, executor, language_detection, logs, message_store, recorder, speech_engines, text_to_speech, translator
+
+# Off by default: the dummy recognition and translation are real upstream calls
+WARM_UP = config("WARM_UP", default=False, cast=bool)
+WARM_UP_TIMEOUT = config("WARM_UP_TIMEOUT", default=60, cast=float)
+
+logger = logs.get_logger("warmup")
+
+
+def _language_profiles():
+    language_detection.load_profiles()
+    language_detection.detect("hello, how are you today")
+
+
+def _speech_engine():
+    speech_engines.get_engine()
+    # Half a second of quiet audio: exercises the whole recognition path
+    # without anything to transcribe
+    recorder.recognize_pcm(b"\x00\x00" * 8000, 16000, 2, "en-US")
+
+
+def _message_history():
+    message_store.store.recent(database.SPEECH_CHANNEL, 1)
+
+
+async def _translation():
+    await translator.translate_async("hello", "es", "en")
+
+
+STEPS = [
+    ("language_profiles", lambda: asyncio.to_thread(_language_profiles)),
+    ("message_store", lambda: asyncio.to_thread(_message_history)),
+    ("speech_engine", lambda: executor.run("asr", _speech_engine, timeout=WARM_UP_TIMEOUT)),
+    ("translation", _translation),
+    ("tts_connection", text_to_speech.warm_up),
+]
+
+
+# Readiness of this process: not ready until startup (and the warm-up, when
+# enabled) is done, so a load balancer keeps traffic on the old instances
+# during a rolling restart
+class Readiness:
+
+    def __init__(self):
+        self.ready = False
+        self.steps = {}
+        self._task = None
+
+    def status(self):
+        return {"status": "ready" if self.ready else "warming_up", "steps": self.steps}
+
+    def start(self, enabled=WARM_UP):
+        if not enabled:
+            self.ready = True
+            return
+        self._task = asyncio.create_task(self.run())
+
+    async def run(self):
+        started = time.perf_counter()
+        for name, step in STEPS:
+            step_started = time.perf_counter()
+            try:
+                await asyncio.wait_for(step(), WARM_UP_TIMEOUT)
+                self.steps[name] = "ok"
+            except Exception as e:
+                # A flaky upstream at boot shouldn't keep the instance out of rotation forever
+                self.steps[name] = f"failed: {e!r}"
+                logger.warning("Warm-up step %s failed: %r", name, e)
+            logger.info("Warm-up step %s took %.0f ms", name, (time.perf_counter() - step_started) * 1000)
+        self.ready = True
+        logger.info("Warm-up finished in %.1f s", time.perf_counter() - started)
+
+    async def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+
+readiness = Readiness()
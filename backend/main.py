@@ -1,20 +1,42 @@
+import asyncio
 import json
 import time
-from fastapi import Depends, FastAPI, File, Form, HTTPException, Response, UploadFile, WebSocket, WebSocketDisconnect
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, File, Form, HTTPException, Request, Response, UploadFile, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-import uvicorn
 import os
 from functions import database
-from functions import recorder, translator, text_to_speech
-from sqlalchemy import Column, Integer, String, create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, Session
-from fastapi.responses import JSONResponse, StreamingResponse
+from functions import anonym_codes, audio, audio_cache, audio_pipeline, executor, language_detection, logs, message_store, metrics, recorder, rooms, speech_engines, translation_cache, translator, text_to_speech, vad, warmup
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
 import socketio
+import uuid
+from typing import List, Optional
+from decouple import config
+
+logger = logs.get_logger("main")
+
+@asynccontextmanager
+async def lifespan(app):
+    # Creates the table and warms the in-memory code index
+    await anonym_codes.init()
+    # Preloads models, profiles and upstream connections when WARM_UP is set;
+    # /ready reports 503 until it is done
+    warmup.readiness.start()
+    # Keeps the persistent translation cache within its TTL and row limit
+    cache_purger = asyncio.create_task(translation_cache.purge_periodically())
+    yield
+    cache_purger.cancel()
+    await warmup.readiness.stop()
+    executor.shutdown()
+    speech_engines.shutdown()
+    await text_to_speech.close_client()
+    message_store.store.close()
+    await anonym_codes.close()
+    await room_registry.close()
 
 # Define the FastAPI app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # CORS middleware
 origins = [
@@ -30,8 +52,51 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Trace-Id"],
 )
 
+MAX_UPLOAD_BYTES = config("MAX_UPLOAD_BYTES", default=10 * 1024 * 1024, cast=int)
+# Room for the multipart boundaries and the other form fields
+UPLOAD_FORM_OVERHEAD = 64 * 1024
+
+@app.middleware("http")
+async def limit_upload_size(request: Request, call_next):
+    # Turn oversized uploads away before Starlette reads and spools the body;
+    # post_text still checks the parsed file for requests without Content-Length
+    if request.url.path == "/post_text/":
+        try:
+            length = int(request.headers.get("content-length", 0))
+        except ValueError:
+            return JSONResponse(status_code=400, content={"detail": "Invalid Content-Length"})
+        if length > MAX_UPLOAD_BYTES + UPLOAD_FORM_OVERHEAD:
+            return JSONResponse(status_code=413, content={"detail": "Audio file is too large"})
+    return await call_next(request)
+
+@app.middleware("http")
+async def trace_and_time(request: Request, call_next):
+    # Honour a caller's trace id, otherwise sample a new one
+    incoming = request.headers.get("x-trace-id")
+    if incoming:
+        logs.trace_id_var.set(incoming[:64])
+    else:
+        logs.new_trace_id()
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        # Label by route template, not raw path, to keep the series count bounded
+        route = request.scope.get("route")
+        metrics.HTTP_SECONDS.observe(time.perf_counter() - started, method=request.method,
+                                     route=getattr(route, "path", "unmatched"), status=status)
+    trace_id = logs.current_trace_id()
+    if trace_id:
+        response.headers["X-Trace-Id"] = trace_id
+        logger.debug("%s %s -> %d in %.1f ms", request.method, request.url.path, status,
+                     (time.perf_counter() - started) * 1000)
+    return response
+
 # Define your data models
 class TranslationRequest(BaseModel):
     text: str
@@ -50,61 +115,115 @@ async def audio_streaming(websocket: WebSocket):
     
     wav_data = None
     selected_Lang = None
+    streaming = False
+    segmenter = None  # Per-connection VAD state, only used in streaming mode
+    noise_floor = vad.NoiseFloor()  # Calibrated once per connection, then tracks the background noise
+    connection_id = uuid.uuid4().hex[:12]
+    frame_count = 0
+    # This loop is only the receive stage; recognition, translation and
+    # sending run concurrently behind it (see functions/audio_pipeline.py)
+    pipeline = audio_pipeline.AudioPipeline(lambda payload: websocket.send_text(json.dumps(payload)))
+    metrics.CONNECTIONS.inc(kind="ws_audio")
+
+    async def submit_flushed(segmenter, settings):
+        flushed = segmenter.flush()
+        if flushed is not None:
+            kind, index, segment = flushed
+            await pipeline.submit(segment, segmenter.sample_rate, 2,
+                                  settings.get('selectedFrom'), settings.get('selectedTo'), kind, index)
     
     try:
         while True:
             message_type = await websocket.receive()  # General receive method
-            print("Received message from websocket")
+            if message_type['type'] == 'websocket.disconnect':
+                raise WebSocketDisconnect(message_type.get('code', 1000))
 
             # Handle incoming message if it's a dictionary (language settings)
             if 'text' in message_type:
                 try:
                     # Parse the received text message as JSON (language settings)
-                    selected_Lang = json.loads(message_type['text'])
-                    if isinstance(selected_Lang, dict):
-                        print(f"Received language settings: {selected_Lang}")
+                    settings = json.loads(message_type['text'])
+                    if isinstance(settings, dict) and settings.get('type') == 'end':
+                        # {"type": "end"}: the client stopped recording. Finish the utterance
+                        # in progress and confirm once every result has been sent
+                        if segmenter is not None and selected_Lang is not None:
+                            await submit_flushed(segmenter, selected_Lang)
+                        await pipeline.drain()
+                        if pipeline.closed:
+                            break
+                        await pipeline.send_json({"type": "end"})
+                    elif isinstance(settings, dict):
+                        logger.debug("Received language settings: %s", settings)
+                        # Results for the old language pair are no longer wanted, except
+                        # for the utterance in progress, which is finished in its own language
+                        if selected_Lang is not None and (
+                                (settings.get('selectedFrom'), settings.get('selectedTo'))
+                                != (selected_Lang.get('selectedFrom'), selected_Lang.get('selectedTo'))):
+                            await pipeline.reset()
+                            if segmenter is not None:
+                                await submit_flushed(segmenter, selected_Lang)
+                        selected_Lang = settings
+                        # {"mode": "stream"} switches to incremental recognition of WAV chunks,
+                        # raw PCM frames (see functions/audio.py) are always streamed
+                        streaming = selected_Lang.get('mode') == 'stream'
                     else:
-                        await websocket.send_text(json.dumps({"error": "Invalid language settings format. Expected a dictionary."}))
+                        await pipeline.send_json({"error": "Invalid language settings format. Expected a dictionary."})
 
                 except json.JSONDecodeError:
-                    await websocket.send_text(json.dumps({"error": "Invalid JSON format."}))
+                    await pipeline.send_json({"error": "Invalid JSON format."})
 
             # Handle incoming message if it's binary data (WAV file)
             elif 'bytes' in message_type:
                 wav_data = message_type['bytes']
-                print("Received binary WAV data")
+                recorder.capture_audio(wav_data, connection_id, frame_count, "pcm" if audio.is_pcm_frame(wav_data) else "wav")
+                frame_count += 1
 
-                if wav_data is not None and selected_Lang is not None:
-                    # Extract the language settings (selectedFrom and selectedTo)
+                if (streaming or audio.is_pcm_frame(wav_data)) and selected_Lang is not None:
                     selectedTo = selected_Lang.get('selectedTo')
                     selectedFrom = selected_Lang.get('selectedFrom')
 
                     try:
-                        # Assuming 'recorder.recognize_stream' is your speech recognition function
-                        text = recorder.recognize_stream(wav_data, selectedFrom)
-
-                        if text:
-                            # Assuming 'translator.translate_textt' is your translation function
-                            translatedText = translator.translate_textt(text, selectedTo)
+                        if audio.is_pcm_frame(wav_data):
+                            samples, source_rate = audio.decode_pcm_frame(wav_data)
+                        else:
+                            samples, source_rate = audio.decode_wav(wav_data)
+                        pcm, sample_rate = audio.prepare(samples, source_rate)
+                        if segmenter is None:
+                            segmenter = vad.Segmenter(sample_rate, noise_floor=noise_floor)
+                        # Only the newly completed segments are recognized, never the whole history
+                        for kind, index, segment in segmenter.feed(pcm):
+                            await pipeline.submit(segment, sample_rate, 2, selectedFrom, selectedTo, kind, index)
+                    except ValueError as e:
+                        await pipeline.send_json({"error": f"Invalid audio chunk: {e}"})
+
+                elif wav_data is not None and selected_Lang is not None:
+                    # Extract the language settings (selectedFrom and selectedTo)
+                    selectedTo = selected_Lang.get('selectedTo')
+                    selectedFrom = selected_Lang.get('selectedFrom')
 
-                            if translatedText:
-                                # Create a JSON object with both the transcribed and translated text
-                                message = {
-                                    "transcribedText": text,
-                                    "translatedText": translatedText
-                                }
+                    try:
+                        samples, source_rate = audio.decode_wav(wav_data)
+                        pcm, sample_rate = audio.prepare(samples, source_rate)
+                        # Don't send silence to the recognizer
+                        if not noise_floor.contains_speech(pcm, sample_rate):
+                            continue
 
-                                # Send the JSON message back to the client
-                                await websocket.send_text(json.dumps(message))
+                        # The whole chunk is one utterance; the transcribed and translated
+                        # text come back once the pipeline gets to it
+                        await pipeline.submit(pcm, sample_rate, 2, selectedFrom, selectedTo)
 
-                    except Exception as e:
-                        print("problem")
+                    except ValueError as e:
+                        await pipeline.send_json({"error": f"Invalid audio chunk: {e}"})
 
                 else:
-                    await websocket.send_text(json.dumps({"error": "Missing WAV data or language settings."}))
+                    await pipeline.send_json({"error": "Missing WAV data or language settings."})
 
     except WebSocketDisconnect:
-        print("WebSocket disconnected")
+        logger.debug("WebSocket disconnected")
+    finally:
+        # Nobody is left to read the results
+        await pipeline.close()
+        metrics.CONNECTIONS.dec(kind="ws_audio")
 
 
 # Define other endpoints
@@ -116,116 +235,240 @@ async def read_root():
 async def favicon():
     return Response(status_code=204)
 
+# Serve a cached audio file, honouring a single-range Range header
+def audio_file_response(path, range_header, key):
+    size = os.path.getsize(path)
+    headers = {"Accept-Ranges": "bytes", "X-Audio-Key": key}
+    try:
+        byte_range = audio_cache.parse_byte_range(range_header, size)
+    except ValueError:
+        return Response(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+    if byte_range is None:
+        return FileResponse(path, media_type="application/octet-stream", headers=headers)
+
+    start, end = byte_range
+    def iterrange():
+        with open(path, "rb") as audio_file:
+            audio_file.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = audio_file.read(min(64 * 1024, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(iterrange(), status_code=206, media_type="application/octet-stream", headers=headers)
+
 @app.post("/text_voice/")
-async def text_voice(request: Voice_textReq):
+async def text_voice(request: Voice_textReq, http_request: Request):
     if not request.text:
         raise HTTPException(status_code=400, detail="Text parameter is required")
+
+    key = text_to_speech.speech_key(request.text, request.selectedGender)
     try:
-        audio_output = text_to_speech.convert_text_to_speech(request.text, request.selectedGender)
-        def iterfile():
-            yield audio_output
-        return StreamingResponse(iterfile(), media_type="application/octet-stream")
+        # Repeated phrases come straight from disk
+        cached_path = await executor.run("tts", audio_cache.cache.lookup, key)
+        if cached_path:
+            return audio_file_response(cached_path, http_request.headers.get("range"), key)
+
+        # Chunks are forwarded as ElevenLabs produces them
+        chunks = await text_to_speech.stream_speech(request.text, request.selectedGender)
+        return StreamingResponse(chunks, media_type="application/octet-stream", headers={"X-Audio-Key": key})
+    except (executor.Overloaded, text_to_speech.TextToSpeechBusy):
+        raise HTTPException(status_code=503, detail="Server is busy, please try again")
+    except text_to_speech.TextToSpeechTimeout:
+        raise HTTPException(status_code=504, detail="Text to speech timed out")
     except Exception as e:
-        print(f"An error occurred: {e}")
+        logger.error("Text to speech failed: %r", e)
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
+@app.get("/text_voice/{key}")
+async def cached_voice(key: str, http_request: Request):
+    if len(key) != 64 or any(c not in "0123456789abcdef" for c in key):
+        raise HTTPException(status_code=404, detail="Audio not found")
+    try:
+        cached_path = await executor.run("tts", audio_cache.cache.lookup, key)
+    except executor.Overloaded:
+        raise HTTPException(status_code=503, detail="Server is busy, please try again")
+    if not cached_path:
+        raise HTTPException(status_code=404, detail="Audio not found")
+    return audio_file_response(cached_path, http_request.headers.get("range"), key)
+
 @app.post("/post_text/")
-async def post_text(file: UploadFile = File(...), language: str = Form(...)):
-    file_path = f"temp_{file.filename}"
+async def post_text(file: UploadFile = File(...), language: str = Form(...), username: str = Form(None)):
+    # The upload is already spooled by Starlette (memory first, disk past 1 MB),
+    # so recognition reads it in place instead of copying it to a temp file
+    file.file.seek(0, os.SEEK_END)
+    size = file.file.tell()
+    file.file.seek(0)
+    if size > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail="Audio file is too large")
     try:
-        with open(file_path, "wb") as buffer:
-            buffer.write(file.file.read())
-        print(f"File saved at {file_path}")
-        print(f"Selected language: {language}")
-        text = recorder.record_text(file_path, language)
+        logger.debug("Received %s (%d bytes), language %s", file.filename, size, language)
+        text = await executor.run("asr", recorder.record_text, file.file, language)
         if text:
-            translated_text = translator.translate_textt(text, language)
+            translated_text = await translator.translate_async(text, language)
         else:
             raise HTTPException(status_code=400, detail="Could not process audio file")
-        database.store_messages(text, translated_text)
+        channel = f"user:{username}" if username else database.SPEECH_CHANNEL
+        database.store_messages(text, translated_text, channel=channel, sender=username)
         return JSONResponse(content={"text": text, "translated_text": translated_text})
+    except HTTPException:
+        raise
+    except executor.Overloaded:
+        raise HTTPException(status_code=503, detail="Server is busy, please try again")
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Speech processing timed out")
     except Exception as e:
-        print(f"An error occurred: {e}")
+        logger.error("Speech to text failed: %r", e)
         raise HTTPException(status_code=500, detail="Internal Server Error")
-    finally:
-        if os.path.exists(file_path):
-            os.remove(file_path)
+
+@app.get("/messages/{channel}")
+async def message_history(channel: str, before: str = None, limit: int = 50):
+    # Only chat rooms are shared; "user:" and speech channels hold one person's
+    # conversation and there is no authentication to check who is asking
+    if not channel.startswith("room:"):
+        raise HTTPException(status_code=404, detail="Channel not found")
+    limit = max(1, min(limit, 200))
+    try:
+        messages, next_cursor = await asyncio.to_thread(message_store.store.history, channel, before, limit)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return {"messages": messages, "next_cursor": next_cursor}
 
 @app.post("/text_translate/")
 async def text_translation(request: TranslationRequest):
     try:
-        translated_text = translator.translate_textt(request.text, request.language)
+        translated_text = await translator.translate_async(request.text, request.language)
         return JSONResponse(content={"text": request.text, "translated_text": translated_text})
+    except executor.Overloaded:
+        raise HTTPException(status_code=503, detail="Server is busy, please try again")
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Translation timed out")
     except Exception as e:
-        print(f"An error occurred: {e}")
+        logger.error("Translation failed: %r", e)
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
-# Database setup
-DATABASE_URL = "sqlite:///./main.db"
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base()
+class BatchTranslationItem(BaseModel):
+    text: str
+    language: str
+    source: Optional[str] = None
 
-class AnonymCode(Base):
-    __tablename__ = "anonym_codes"
-    id = Column(Integer, primary_key=True, index=True)
-    code = Column(String, unique=True, index=True)
+class BatchTranslationRequest(BaseModel):
+    items: List[BatchTranslationItem]
 
-Base.metadata.create_all(bind=engine)
+BATCH_MAX_ITEMS = config("TRANSLATION_BATCH_MAX_ITEMS", default=500, cast=int)
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+@app.post("/text_translate/batch")
+async def batch_text_translation(request: BatchTranslationRequest):
+    if len(request.items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_ITEMS} items per batch")
+    results = await translator.translate_batch([(item.text, item.language, item.source) for item in request.items])
+    return JSONResponse(content={"results": [
+        {"text": item.text, "language": item.language, "translated_text": translated_text, "error": error}
+        for item, (translated_text, error) in zip(request.items, results)
+    ]})
 
 class AnonymCodeRequest(BaseModel):
     code: str
 
+class AnonymCodesRequest(BaseModel):
+    codes: List[str]
+
 @app.post("/save_anonym_code/")
-async def save_anonym_code(request: AnonymCodeRequest, db: Session = Depends(get_db)):
-    new_code = AnonymCode(code=request.code)
+async def save_anonym_code(request: AnonymCodeRequest):
     try:
-        db.add(new_code)
-        db.commit()
-        db.refresh(new_code)
+        new_code = await anonym_codes.save_code(request.code)
     except Exception as e:
-        db.rollback()
-        print(f"An error occurred: {e}")
+        logger.error("Saving anonym code failed: %r", e)
         raise HTTPException(status_code=500, detail="Internal Server Error")
     return {"message": "Anonym code saved successfully", "code": new_code.code}
 
 @app.post("/check_anonym_code/")
-async def check_anonym_code(request: AnonymCodeRequest, db: Session = Depends(get_db)):
-    existing_code = db.query(AnonymCode).filter(AnonymCode.code == request.code).first()
-    if existing_code:
+async def check_anonym_code(request: AnonymCodeRequest):
+    if await anonym_codes.code_exists(request.code):
         return {"exists": True}
     else:
         return {"exists": False}
 
-# Initialize Socket.IO server
-sio = socketio.AsyncServer(cors_allowed_origins="*")
-user_languages = {}
+@app.post("/save_anonym_codes/")
+async def save_anonym_codes(request: AnonymCodesRequest):
+    try:
+        saved, existing = await anonym_codes.save_codes(request.codes)
+    except Exception as e:
+        logger.error("Saving anonym codes failed: %r", e)
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+    return {"saved": saved, "existing": existing}
+
+@app.post("/check_anonym_codes/")
+async def check_anonym_codes(request: AnonymCodesRequest):
+    return {"exists": await anonym_codes.codes_exist(request.codes)}
+
+@app.get("/ready")
+async def ready():
+    status = warmup.readiness.status()
+    return JSONResponse(content=status, status_code=200 if warmup.readiness.ready else 503)
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+# Initialize Socket.IO server. With a message queue (redis://..., or
+# tools/miniredis.py locally) emits reach members connected to any worker,
+# so the app can run under uvicorn --workers N or on several nodes
+SOCKETIO_MESSAGE_QUEUE = config("SOCKETIO_MESSAGE_QUEUE", default="")
+client_manager = socketio.AsyncRedisManager(SOCKETIO_MESSAGE_QUEUE) if SOCKETIO_MESSAGE_QUEUE else None
+sio = socketio.AsyncServer(async_mode="asgi", cors_allowed_origins="*", client_manager=client_manager)
+room_registry = rooms.create_registry()
+# Aggregates only: room ids come from clients, so a per-room label would
+# let the series count grow without bound
+metrics.Gauge("chat_rooms", "Socket.IO rooms with members on this worker",
+              callback=lambda: len(room_registry.room_sizes()))
+metrics.Gauge("chat_room_members", "Room memberships on this worker, summed over rooms",
+              callback=lambda: sum(room_registry.room_sizes().values()))
+metrics.Gauge("chat_room_members_max", "Members on this worker in the largest room",
+              callback=lambda: max(room_registry.room_sizes().values(), default=0))
 
 @sio.event
 async def connect(sid, environ):
-    print('New user connected:', sid)
+    metrics.CONNECTIONS.inc(kind="socketio")
+    logger.debug("New user connected: %s", sid)
 
 @sio.event
-async def join_room(sid, roomId):
-    print(f"User {sid} joined room {roomId}")
-    sio.enter_room(sid, roomId)
+async def join_room(sid, roomId, username=None):
+    logger.debug("User %s joined room %s", sid, roomId)
+    await sio.enter_room(sid, roomId)
+    if await room_registry.join(sid, roomId):
+        await sio.enter_room(sid, rooms.language_room(roomId, room_registry.language(sid)))
 
 @sio.event
 async def leave_room(sid, roomId):
-    print(f"User {sid} left room {roomId}")
-    sio.leave_room(sid, roomId)
+    logger.debug("User %s left room %s", sid, roomId)
+    await sio.leave_room(sid, roomId)
+    language = room_registry.language(sid)
+    if await room_registry.leave(sid, roomId):
+        await sio.leave_room(sid, rooms.language_room(roomId, language))
 
 @sio.event
 async def set_language(sid, language):
-    user_languages[sid] = language
-    print(f"User {sid} set language to {language}")
+    previous = await room_registry.set_language(sid, language)
+    if previous != language:
+        # Move the user into the matching language group of every room they are in
+        for roomId in room_registry.rooms_of(sid):
+            await sio.leave_room(sid, rooms.language_room(roomId, previous))
+            await sio.enter_room(sid, rooms.language_room(roomId, language))
+    logger.debug("User %s set language to %s", sid, language)
+
+async def translate_for(text, language, source_lang=None):
+    if language == rooms.DEFAULT_LANGUAGE:
+        return text
+    try:
+        return await translator.translate_async(text, language, source_lang)
+    except (executor.Overloaded, asyncio.TimeoutError) as e:
+        logger.warning("Translation to %s skipped: %r", language, e)
+        return None
 
 @sio.event
 async def send_message(sid, data):
@@ -234,28 +477,37 @@ async def send_message(sid, data):
         'username': data.get('username'),
         'text': data.get('text')
     }
-    print(f"Received message from {sid} in room {roomId}: {message}")
-
-    # Get the list of all users in the room
-    room_users = sio.rooms(roomId)
-
-    # Translate and send the message to each user based on their language preference
-    for user_sid in room_users:
-        user_language = user_languages.get(user_sid, 'en')
-        if user_language != 'en':  # Assuming 'en' is the default language
-            translated_text = await translator.translate_text(message['text'], user_language)
-        else:
-            translated_text = message['text']
-        await sio.emit('message', {'username': message['username'], 'text': message['text'], 'translated_text': translated_text}, room=user_sid)
-        print(f"Message sent to user {user_sid} in room {roomId}: {message}")
+    logs.new_trace_id()
+    logger.debug("Received message from %s in room %s", sid, roomId)
+    message_store.store.append(f"room:{roomId}", "user", message['text'] or "", sender=message['username'])
+
+    # Translate once per language spoken in the room, all languages concurrently
+    languages = await room_registry.languages_in(roomId)
+    source_lang = None
+    if message['text'] and any(language != rooms.DEFAULT_LANGUAGE for language in languages):
+        # Detect once for the whole fan-out rather than once per language
+        try:
+            source_lang = await executor.run("translation", language_detection.detect, message['text'])
+        except Exception as e:
+            logger.warning("Language detection failed: %r", e)
+    translations = await asyncio.gather(*(translate_for(message['text'], language, source_lang) for language in languages))
+
+    # One emit per language group instead of one per user
+    with metrics.STAGE_SECONDS.time(stage="emit"):
+        for language, translated_text in zip(languages, translations):
+            await sio.emit('message', {'username': message['username'], 'text': message['text'], 'translated_text': translated_text},
+                           room=rooms.language_room(roomId, language))
+    logger.debug("Message sent to %d language group(s) in room %s", len(languages), roomId)
 
 @sio.event
 async def disconnect(sid):
-    print('User disconnected:', sid)
-    user_languages.pop(sid, None)
+    metrics.CONNECTIONS.dec(kind="socketio")
+    logger.debug("User disconnected: %s", sid)
+    await room_registry.remove(sid)
 
 # Combine FastAPI and Socket.IO
 app = socketio.ASGIApp(sio, other_asgi_app=app)
 
 if __name__ == "__main__":
+    import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
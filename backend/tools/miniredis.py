@@ -0,0 +1,365 @@
+import argparse
+import asyncio
+import fnmatch
+import time
+
+# A small Redis-protocol (RESP2) server for running several backend workers
+# on one machine without installing Redis. It implements only what the
+# Socket.IO message queue and the shared room registry use: pub/sub, strings,
+# hashes, sets and key expiry. Data lives in memory and is lost on exit.
+#
+#   python -m tools.miniredis --port 6379
+#   SOCKETIO_MESSAGE_QUEUE=redis://127.0.0.1:6379/0 uvicorn main:app --workers 4
+
+
+class CommandError(Exception):
+    pass
+
+
+class WrongType(CommandError):
+
+    def __init__(self):
+        super().__init__("WRONGTYPE Operation against a key holding the wrong kind of value")
+
+
+def encode(value):
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, bool):
+        return b":%d\r\n" % int(value)
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if isinstance(value, str):
+        return b"+" + value.encode() + b"\r\n"
+    if isinstance(value, bytes):
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+    if isinstance(value, CommandError):
+        message = str(value)
+        if not message.split(" ", 1)[0].isupper():
+            message = f"ERR {message}"
+        return b"-" + message.encode() + b"\r\n"
+    if isinstance(value, (list, tuple)):
+        return b"*%d\r\n" % len(value) + b"".join(encode(item) for item in value)
+    raise TypeError(f"Cannot encode {type(value).__name__}")
+
+
+async def read_command(reader):
+    line = await reader.readline()
+    if not line:
+        return None
+    if not line.startswith(b"*"):
+        # Inline command, as typed into telnet
+        return line.strip().split()
+    args = []
+    for _ in range(int(line[1:])):
+        header = await reader.readline()
+        if not header.startswith(b"$"):
+            raise CommandError("Protocol error: expected '$'")
+        length = int(header[1:])
+        args.append((await reader.readexactly(length + 2))[:-2])
+    return args
+
+
+class Store:
+
+    def __init__(self):
+        self.data = {}
+        self.expires = {}
+
+    def _alive(self, key):
+        deadline = self.expires.get(key)
+        if deadline is not None and deadline <= time.monotonic():
+            self.data.pop(key, None)
+            del self.expires[key]
+        return key in self.data
+
+    def get(self, key, kind):
+        if not self._alive(key):
+            return None
+        value = self.data[key]
+        if not isinstance(value, kind):
+            raise WrongType()
+        return value
+
+    def get_or_create(self, key, kind):
+        value = self.get(key, kind)
+        if value is None:
+            value = self.data[key] = kind()
+        return value
+
+    def delete(self, key):
+        self.expires.pop(key, None)
+        return self.data.pop(key, None) is not None
+
+    def drop_if_empty(self, key):
+        if key in self.data and not self.data[key]:
+            self.delete(key)
+
+    def sweep(self):
+        now = time.monotonic()
+        for key in [k for k, deadline in self.expires.items() if deadline <= now]:
+            self.delete(key)
+
+
+class MiniRedis:
+
+    def __init__(self):
+        self.store = Store()
+        self.channels = {}
+
+    # -- keys and strings --
+
+    def cmd_ping(self, client, *args):
+        return args[0] if args else "PONG"
+
+    def cmd_echo(self, client, message):
+        return message
+
+    def cmd_select(self, client, db):
+        return "OK"
+
+    def cmd_auth(self, client, *args):
+        return "OK"
+
+    def cmd_client(self, client, *args):
+        return "OK"
+
+    def cmd_info(self, client, *args):
+        return b"# Server\r\nredis_version:7.0.0-mini\r\n"
+
+    def cmd_flushall(self, client, *args):
+        self.store = Store()
+        return "OK"
+
+    cmd_flushdb = cmd_flushall
+
+    def cmd_get(self, client, key):
+        return self.store.get(key, bytes)
+
+    def cmd_set(self, client, key, value, *options):
+        options = [option.upper() for option in options]
+        if b"NX" in options and self.store._alive(key):
+            return None
+        if b"XX" in options and not self.store._alive(key):
+            return None
+        self.store.delete(key)
+        self.store.data[key] = value
+        for unit, scale in ((b"EX", 1.0), (b"PX", 0.001)):
+            if unit in options:
+                self.store.expires[key] = time.monotonic() + int(options[options.index(unit) + 1]) * scale
+        return "OK"
+
+    def cmd_del(self, client, *keys):
+        return sum(self.store.delete(key) for key in keys if self.store._alive(key))
+
+    cmd_unlink = cmd_del
+
+    def cmd_exists(self, client, *keys):
+        return sum(1 for key in keys if self.store._alive(key))
+
+    def cmd_keys(self, client, pattern):
+        pattern = pattern.decode()
+        return [key for key in list(self.store.data) if self.store._alive(key) and fnmatch.fnmatchcase(key.decode(), pattern)]
+
+    def cmd_expire(self, client, key, seconds):
+        if not self.store._alive(key):
+            return 0
+        self.store.expires[key] = time.monotonic() + int(seconds)
+        return 1
+
+    def cmd_pexpire(self, client, key, milliseconds):
+        if not self.store._alive(key):
+            return 0
+        self.store.expires[key] = time.monotonic() + int(milliseconds) / 1000
+        return 1
+
+    def cmd_ttl(self, client, key):
+        if not self.store._alive(key):
+            return -2
+        deadline = self.store.expires.get(key)
+        return -1 if deadline is None else max(0, round(deadline - time.monotonic()))
+
+    def cmd_incrby(self, client, key, amount):
+        value = int(self.store.get(key, bytes) or 0) + int(amount)
+        self.store.data[key] = str(value).encode()
+        return value
+
+    def cmd_incr(self, client, key):
+        return self.cmd_incrby(client, key, 1)
+
+    # -- hashes --
+
+    def cmd_hset(self, client, key, *pairs):
+        if not pairs or len(pairs) % 2:
+            raise CommandError("wrong number of arguments for 'hset' command")
+        table = self.store.get_or_create(key, dict)
+        added = 0
+        for field, value in zip(pairs[::2], pairs[1::2]):
+            added += field not in table
+            table[field] = value
+        return added
+
+    def cmd_hget(self, client, key, field):
+        return (self.store.get(key, dict) or {}).get(field)
+
+    def cmd_hgetall(self, client, key):
+        table = self.store.get(key, dict) or {}
+        return [item for pair in table.items() for item in pair]
+
+    def cmd_hdel(self, client, key, *fields):
+        table = self.store.get(key, dict)
+        if table is None:
+            return 0
+        removed = sum(table.pop(field, None) is not None for field in fields)
+        self.store.drop_if_empty(key)
+        return removed
+
+    def cmd_hincrby(self, client, key, field, amount):
+        table = self.store.get_or_create(key, dict)
+        value = int(table.get(field, 0)) + int(amount)
+        table[field] = str(value).encode()
+        return value
+
+    # -- sets --
+
+    def cmd_sadd(self, client, key, *members):
+        members_set = self.store.get_or_create(key, set)
+        before = len(members_set)
+        members_set.update(members)
+        return len(members_set) - before
+
+    def cmd_srem(self, client, key, *members):
+        members_set = self.store.get(key, set)
+        if members_set is None:
+            return 0
+        before = len(members_set)
+        members_set.difference_update(members)
+        removed = before - len(members_set)
+        self.store.drop_if_empty(key)
+        return removed
+
+    def cmd_smembers(self, client, key):
+        return sorted(self.store.get(key, set) or ())
+
+    def cmd_scard(self, client, key):
+        return len(self.store.get(key, set) or ())
+
+    # -- pub/sub --
+
+    def cmd_publish(self, client, channel, message):
+        subscribers = self.channels.get(channel, set())
+        for subscriber in list(subscribers):
+            subscriber.send([b"message", channel, message])
+        return len(subscribers)
+
+    def cmd_subscribe(self, client, *channels):
+        for channel in channels:
+            self.channels.setdefault(channel, set()).add(client)
+            client.subscriptions.add(channel)
+            client.send([b"subscribe", channel, len(client.subscriptions)])
+
+    def cmd_unsubscribe(self, client, *channels):
+        channels = channels or sorted(client.subscriptions)
+        if not channels:
+            client.send([b"unsubscribe", None, 0])
+        for channel in channels:
+            self.channels.get(channel, set()).discard(client)
+            if not self.channels.get(channel):
+                self.channels.pop(channel, None)
+            client.subscriptions.discard(channel)
+            client.send([b"unsubscribe", channel, len(client.subscriptions)])
+
+    def drop(self, client):
+        for channel in client.subscriptions:
+            subscribers = self.channels.get(channel, set())
+            subscribers.discard(client)
+            if not subscribers:
+                self.channels.pop(channel, None)
+        client.subscriptions.clear()
+
+    def execute(self, client, args):
+        name = args[0].decode().lower()
+        handler = getattr(self, f"cmd_{name}", None)
+        if handler is None:
+            return CommandError(f"unknown command '{name}'")
+        if client.subscriptions and name not in ("subscribe", "unsubscribe", "ping"):
+            return CommandError(f"Can't execute '{name}' in subscribed mode")
+        if client.subscriptions and name == "ping":
+            return [b"pong", args[1] if len(args) > 1 else b""]
+        try:
+            return handler(client, *args[1:])
+        except TypeError:
+            return CommandError(f"wrong number of arguments for '{name}' command")
+        except ValueError:
+            return CommandError("value is not an integer or out of range")
+        except CommandError as e:
+            return e
+
+
+class Client:
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.subscriptions = set()
+
+    def send(self, value):
+        self.writer.write(encode(value))
+
+
+async def sweep_expired(server, interval=1.0):
+    while True:
+        await asyncio.sleep(interval)
+        server.store.sweep()
+
+
+async def serve(host="127.0.0.1", port=6379):
+    server = MiniRedis()
+
+    async def handle(reader, writer):
+        client = Client(writer)
+        try:
+            while True:
+                try:
+                    args = await read_command(reader)
+                except CommandError as e:
+                    client.send(e)
+                    break
+                if args is None:
+                    break
+                if not args:
+                    continue
+                result = server.execute(client, args)
+                # Pub/sub commands reply through client.send themselves
+                if not (result is None and args[0].lower() in (b"subscribe", b"unsubscribe")):
+                    client.send(result)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            server.drop(client)
+            writer.close()
+
+    listener = await asyncio.start_server(handle, host, port)
+    sweeper = asyncio.create_task(sweep_expired(server))
+    return listener, sweeper
+
+
+async def main(host, port):
+    listener, sweeper = await serve(host, port)
+    print(f"miniredis listening on {host}:{port}")
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        sweeper.cancel()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="In-memory Redis stand-in for local multi-worker runs")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6379)
+    args = parser.parse_args()
+    try:
+        asyncio.run(main(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
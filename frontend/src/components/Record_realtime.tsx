@@ -1,6 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import RecordIcon from './RecordIcon';
-import float32ArrayToWav from '../utils/float32towav';
+import float32ArrayToPcmFrame from '../utils/float32topcm';
 import ChooseLang from './chooselang';
 
 
@@ -87,12 +87,11 @@ const RecordMessage_realtime: React.FC = () => {
       setSocket(ws);
   
       processor.port.onmessage = (event: MessageEvent) => {
-        const float32Array = event.data as Float32Array;
-        const wavBlob = float32ArrayToWav(float32Array, 48000);
+        const float32Array = Float32Array.from(event.data as number[]);
+        const pcmFrame = float32ArrayToPcmFrame(float32Array, context.sampleRate);
   
         if (ws.readyState === WebSocket.OPEN) {
-          ws.send(wavBlob);
-          console.log('Sending WAV data to WebSocket:', wavBlob);
+          ws.send(pcmFrame);
         }
       };
     } catch (err: any) {
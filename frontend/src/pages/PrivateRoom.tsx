@@ -20,7 +20,8 @@ interface LocationState {
   selectedGender: string;
 }
 
-const socket: Socket = io('http://localhost:5000');
+// WebSocket only: long-polling would need sticky sessions once the backend runs several workers
+const socket: Socket = io('http://localhost:5000', { transports: ['websocket'] });
 
 const ChatRoom: React.FC = () => {
   const { roomId } = useParams<{ roomId: string }>();
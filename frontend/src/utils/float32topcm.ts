@@ -0,0 +1,25 @@
+// Wrap Float32 microphone samples in the backend's raw PCM frame format:
+// a 12 byte little-endian header ("PCM1", format, channels, reserved, sample rate)
+// followed by the samples themselves. Avoids building a WAV file per chunk.
+const PCM_FORMAT_FLOAT32 = 2;
+
+export default function float32ArrayToPcmFrame(float32Array: Float32Array, sampleRate: number, numChannels: number = 1): ArrayBuffer {
+    const headerSize = 12;
+    const buffer = new ArrayBuffer(headerSize + float32Array.length * 4);
+    const view = new DataView(buffer);
+
+    view.setUint8(0, 'P'.charCodeAt(0));
+    view.setUint8(1, 'C'.charCodeAt(0));
+    view.setUint8(2, 'M'.charCodeAt(0));
+    view.setUint8(3, '1'.charCodeAt(0));
+    view.setUint8(4, PCM_FORMAT_FLOAT32);
+    view.setUint8(5, numChannels);
+    view.setUint16(6, 0, true);
+    view.setUint32(8, sampleRate, true);
+
+    for (let i = 0; i < float32Array.length; i++) {
+        view.setFloat32(headerSize + i * 4, float32Array[i], true);
+    }
+
+    return buffer;
+}